@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# Encoding: utf-8
+# -----------------------------------------------------------------------------
+# Project : Broken Promises
+# -----------------------------------------------------------------------------
+# Author : Edouard Richard                                  <edou4rd@gmail.com>
+# -----------------------------------------------------------------------------
+# License : GNU General Public License
+# -----------------------------------------------------------------------------
+# Creation : 18-Oct-2026
+# Last mod : 18-Oct-2026
+# -----------------------------------------------------------------------------
+# This file is part of Broken Promises.
+#
+#     Broken Promises is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Broken Promises is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Broken Promises.  If not, see <http://www.gnu.org/licenses/>.
+
+from   brokenpromises.storage import Storage
+import argparse
+
+__doc__ = """
+
+	Adds the `start` and `end` day ordinals to the references stored before
+	they existed, and creates the indexes used by the range queries.
+
+"""
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Backfill the date ranges of the stored references')
+	parser.parse_args()
+	storage = Storage()
+	storage.ensure_indexes()
+	print "%d articles updated" % (storage.backfill_date_ranges())
+
+# EOF
@@ -38,7 +38,18 @@ __doc__ = """
 listen = ['high', 'default', 'low']
 conn   = redis.from_url(os.getenv('REDISCLOUD_URL', 'redis://localhost:6379'))
 
+def preload():
+	"""
+	Load what every job needs before the worker forks a work horse per job,
+	so it is loaded once per worker instead of once per job.
+	"""
+	from brokenpromises            import settings
+	from brokenpromises.operations import Collector
+	if settings.PRELOAD_TOKENIZER:
+		Collector.get_tokenizer()
+
 if __name__ == '__main__':
+	preload()
 	with Connection(conn):
 		worker = Worker(map(Queue, listen))
 		worker.work()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# Encoding: utf-8
+# -----------------------------------------------------------------------------
+# Project : Broken Promises
+# -----------------------------------------------------------------------------
+# Author : Edouard Richard                                  <edou4rd@gmail.com>
+# -----------------------------------------------------------------------------
+# License : GNU General Public License
+# -----------------------------------------------------------------------------
+# Creation : 18-Oct-2026
+# Last mod : 18-Oct-2026
+# -----------------------------------------------------------------------------
+# This file is part of Broken Promises.
+#
+#     Broken Promises is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Broken Promises is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Broken Promises.  If not, see <http://www.gnu.org/licenses/>.
+
+from   brokenpromises import settings
+import collections
+import cPickle as pickle
+import hashlib
+import os
+import tempfile
+import reporter
+
+debug, trace, info, warning, error, fatal = reporter.bind(__name__)
+
+__doc__ = """
+
+	Cache of the references extracted from the article bodies, see
+	CollectArticles.retrieve_articles_referenced_dates().
+	An entry is found by the hash of the raw body, the channel and the versions
+	of everything which changes the extraction: the channel's FILTERS_VERSION,
+	dateparser.PATTERNS_VERSION and the sentence splitter. Incrementing one of
+	them makes the previous entries unreachable.
+
+"""
+
+# -----------------------------------------------------------------------------
+#
+#    Extraction cache
+#
+# -----------------------------------------------------------------------------
+class ExtractionCache(object):
+	"""
+	The last `size` entries are kept in memory (LRU). If `directory` is given,
+	every entry is also pickled in it, so the entries survive the process
+	and are shared by the workers.
+	"""
+
+	def __init__(self, size=0, directory=None):
+		self.size      = size
+		self.directory = directory
+		self.entries   = collections.OrderedDict()
+		self.hits      = 0
+		self.misses    = 0
+
+	def get(self, key):
+		""" returns the cached value, or None """
+		value = self.entries.pop(key, None)
+		if value is None and self.directory:
+			value = self.read(key)
+		if value is None:
+			self.misses += 1
+			return None
+		self.hits += 1
+		self.remember(key, value)
+		return value
+
+	def set(self, key, value):
+		self.remember(key, value)
+		if self.directory:
+			self.write(key, value)
+
+	def remember(self, key, value):
+		""" keeps the entry in memory as the most recently used """
+		if self.size <= 0:
+			return
+		self.entries.pop(key, None)
+		self.entries[key] = value
+		while len(self.entries) > self.size:
+			self.entries.popitem(last=False)
+
+	def get_path(self, key):
+		return os.path.join(self.directory, key[:2], "%s.pickle" % (key))
+
+	def read(self, key):
+		try:
+			with open(self.get_path(key), "rb") as f:
+				return pickle.load(f)
+		except IOError:
+			return None
+		except Exception as e:
+			warning("unreadable extraction cache entry %s: %s" % (key, e))
+			return None
+
+	def write(self, key, value):
+		path   = self.get_path(key)
+		folder = os.path.dirname(path)
+		try:
+			if not os.path.isdir(folder):
+				os.makedirs(folder)
+			# written aside and renamed, so a reader never sees half an entry
+			fd, temp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+			with os.fdopen(fd, "wb") as f:
+				pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+			os.rename(temp_path, path)
+		except OSError as e:
+			# another process can create the same folder at the same time, the cache stays optional
+			if not os.path.exists(path):
+				warning("extraction cache entry %s not saved: %s" % (key, e))
+
+# -----------------------------------------------------------------------------
+#
+#    MODULE functions
+#
+# -----------------------------------------------------------------------------
+EXTRACTION_CACHE = None # shared by the process, see get_extraction_cache()
+
+def get_extraction_cache():
+	global EXTRACTION_CACHE
+	if EXTRACTION_CACHE is None:
+		EXTRACTION_CACHE = ExtractionCache(settings.EXTRACTION_CACHE_SIZE, settings.EXTRACTION_CACHE_DIR)
+	return EXTRACTION_CACHE
+
+def get_extraction_key(body, channel, *versions):
+	""" key of the references of this body, for this channel and these versions (and search options) """
+	if isinstance(body, unicode):
+		body = body.encode("utf-8")
+	key = hashlib.sha1(body or "")
+	key.update("|".join([channel] + [str(_) for _ in versions]))
+	return key.hexdigest()
+
+# -----------------------------------------------------------------------------
+#
+# TESTS
+#
+# -----------------------------------------------------------------------------
+import unittest
+
+class TestCache(unittest.TestCase):
+	'''Test Class'''
+
+	def test_lru(self):
+		cache = ExtractionCache(size=2)
+		cache.set("a", [1])
+		cache.set("b", [2])
+		assert cache.get("a") == [1]
+		# "b" is the least recently used
+		cache.set("c", [3])
+		assert cache.get("b") is None
+		assert cache.get("a") == [1] and cache.get("c") == [3]
+		assert (cache.hits, cache.misses) == (3, 1)
+		# an empty extraction is cached as well
+		cache.set("d", [])
+		assert cache.get("d") == []
+
+	def test_directory(self):
+		import shutil
+		directory = tempfile.mkdtemp()
+		try:
+			ExtractionCache(size=0, directory=directory).set("abcdef", [{"date": (2014, 1, None)}])
+			cache = ExtractionCache(size=1, directory=directory)
+			assert cache.get("abcdef") == [{"date": (2014, 1, None)}]
+			assert cache.get("abcdeg") is None
+			assert os.listdir(os.path.join(directory, "ab")) == ["abcdef.pickle"]
+		finally:
+			shutil.rmtree(directory)
+
+	def test_get_extraction_key(self):
+		key = get_extraction_key(u"<p>In 2014 \xe9</p>", "brokenpromises.channels.guardian", "1", "1", None)
+		assert key == get_extraction_key(u"<p>In 2014 \xe9</p>", "brokenpromises.channels.guardian", "1", "1", None)
+		assert key != get_extraction_key(u"<p>In 2014 \xe9</p>", "brokenpromises.channels.guardian", "2", "1", None)
+		assert key != get_extraction_key(u"<p>In 2014 \xe9</p>", "brokenpromises.channels.nytimes"  , "1", "1", None)
+		assert key != get_extraction_key(u"<p>In 2015 \xe9</p>", "brokenpromises.channels.guardian", "1", "1", None)
+
+if __name__ == "__main__":
+	# unittest.main()
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestCache)
+	unittest.TextTestRunner(verbosity=2).run(suite)
+
+# EOF
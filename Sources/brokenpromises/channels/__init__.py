@@ -59,6 +59,101 @@ class Catalogue:
 		}
 		return channelClass
 
+# -----------------------------------------------------------------------------
+#
+#    FILTERS PIPELINE
+#
+# -----------------------------------------------------------------------------
+import lxml.html
+import re
+
+class FiltersPipeline(object):
+	"""Returns the text of an html body without the elements which have one
+	of the given classes or tags, nor the texts matching one of the given
+	patterns. The body is parsed once and its tree walked once."""
+
+	def __init__(self, classes=(), tags=(), texts=()):
+		self.classes = set(classes)
+		self.tags    = set(tags)
+		self.texts   = [isinstance(_, basestring) and re.compile(_) or _ for _ in texts]
+
+	def __call__(self, body):
+		if not body or not body.strip():
+			return u""
+		texts = []
+		self.walk(lxml.html.fragment_fromstring(body, create_parent="div"), texts)
+		return u"".join(texts)
+
+	def walk(self, element, texts):
+		if not self.is_removed(element):
+			if self.is_kept(element.text):
+				texts.append(element.text)
+			for child in element:
+				self.walk(child, texts)
+		# the tail is the text after the element, in its parent
+		if self.is_kept(element.tail):
+			texts.append(element.tail)
+
+	def is_removed(self, element):
+		if not isinstance(element.tag, basestring):
+			# comments and processing instructions
+			return True
+		if element.tag in self.tags:
+			return True
+		classes = element.get("class")
+		return bool(classes and self.classes.intersection(classes.split()))
+
+	def is_kept(self, text):
+		return bool(text) and not any(pattern.search(text) for pattern in self.texts)
+
+# -----------------------------------------------------------------------------
+#
+#    RATE LIMITER
+#
+# -----------------------------------------------------------------------------
+import threading
+import time
+
+class TokenBucket(object):
+	"""Allows `rate` calls per second, shared by the threads which call
+	acquire() before each request. The bucket holds at most `capacity`
+	tokens, 1 by default so the calls are evenly spaced, without burst."""
+
+	def __init__(self, rate, capacity=1):
+		self.rate     = float(rate)
+		self.capacity = capacity
+		self.tokens   = capacity
+		self.updated  = time.time()
+		self.lock     = threading.Lock()
+
+	def acquire(self):
+		""" waits for a token and takes it """
+		while True:
+			with self.lock:
+				now          = time.time()
+				self.tokens  = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+				self.updated = now
+				if self.tokens >= 1:
+					self.tokens -= 1
+					return
+				wait = (1 - self.tokens) / self.rate
+			time.sleep(wait)
+
+	def refund(self):
+		""" gives back a token taken for a request which wasn't made """
+		with self.lock:
+			self.tokens = min(self.capacity, self.tokens + 1)
+
+	def __getstate__(self):
+		# the collectors are pickled with their channels by rq, the lock is created again
+		state = self.__dict__.copy()
+		del state["lock"]
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self.lock = threading.Lock()
+
 # -----------------------------------------------------------------------------
 #
 #    CHANNEL BASE CLASS
@@ -68,29 +163,346 @@ class Catalogue:
 #  [ ] set an environment shared by all jobs in this module.
 #  [ ] handle error from scrapping, api, http requests
 #  [ ] logging
+from brokenpromises import settings
+from multiprocessing.pool import ThreadPool
+from bs4                  import BeautifulSoup, SoupStrainer
+import brokenpromises.httpclient
+import brokenpromises.quota
+import brokenpromises.utils
+import datetime
+import random
+import reporter
 
-from bs4 import BeautifulSoup
+debug, trace, info, warning, error, fatal = reporter.bind(__name__)
 
 class Channel(object):
 	"""A data channel is a class that allows to retrieve information from
 	a given channel (ie. The Guardian, New York Times, RSS, etc...)."""
 
-	def __init__(self):
-		pass
+	# removed from the body by apply_filters, see FiltersPipeline
+	FILTERS_CLASSES = ()
+	FILTERS_TAGS    = ("script", "style")
+	FILTERS_TEXTS   = ()
+	# to increment with the filters of a channel, it invalidates its cached extractions
+	FILTERS_VERSION = "1"
+	# calls per second allowed by the channel (API and pages), None for no limit
+	RATE_LIMIT      = None
+	# calls to the API allowed by day, None for no limit (see brokenpromises.quota)
+	DAILY_QUOTA     = None
+	# in seconds, time given to the channel during a collect, settings.CHANNEL_DEADLINE if None
+	DEADLINE        = None
+	# longest query accepted by the API, see plan_queries()
+	QUERY_MAX_LENGTH = 500
+	# elements of the page which contain the body, by order of preference, see extract_body()
+	BODY_SELECTORS   = ()
+	# result pages requested after the first one of each query during a collect,
+	# settings.PAGES_BUDGET if None, see iter_pages()
+	PAGES_BUDGET     = None
+
+	def __init__(self, storage=None, priority=brokenpromises.quota.HIGH):
+		self.filters  = FiltersPipeline(self.FILTERS_CLASSES, self.FILTERS_TAGS, self.FILTERS_TEXTS)
+		# where the already scraped articles are looked up, see retrieve_body()
+		self.storage  = storage
+		self.limiter  = self.RATE_LIMIT and TokenBucket(self.RATE_LIMIT) or None
+		# LOW for the scheduled collects, which leave a part of the DAILY_QUOTA to the users
+		self.priority = priority
+		# calls made to the API, and saved by grouping the keywords (see plan_queries)
+		self.api_calls       = 0
+		self.api_calls_saved = 0
+		# further result pages which can still be requested, and whether some were left
+		# unread for lack of budget (the collect is then incomplete), see iter_pages()
+		self.pages_left       = 0
+		self.budget_exhausted = False
 
 	def apply_filters(self, body):
-		body = BeautifulSoup(body)
-		body = "".join(body.find_all(text=True))
-		return unicode(body)
+		return self.filters(body)
+
+	def get_articles(self, year, month=None, day=None, since=None, deadline=None):
+		return list(self.iter_articles(year, month, day, since=since, deadline=deadline))
+
+	def iter_articles(self, year, month=None, day=None, since=None, deadline=None):
+		"""
+		yields the articles as soon as they are retrieved
+		since    : only the articles published since this date
+		deadline : time (time.time()) after which no more request is sent to the API, see iter_pages()
+		"""
+		raise Exception("need to be implemented")
 
 	def scrape_body_article(self, url, filter_=False):
+		article = self.extract_body(self.get_page(url).text)
+		if filter_:
+			article = self.apply_filters(article)
+		return article
+
+	def get_page(self, url, stored=None):
+		"""
+		requests the page of an article. With the stored article, the request is
+		conditional on its validators: 304 if the page didn't change since its scrap.
+		"""
+		headers = {}
+		if stored and stored.body:
+			if stored.etag:
+				headers["If-None-Match"]     = stored.etag
+			if stored.http_last_modified:
+				headers["If-Modified-Since"] = stored.http_last_modified
+		self.throttle()
+		return self.http.get(url, headers=headers)
+
+	def extract_body(self, html):
+		"""
+		returns the elements of the page matching the first of the BODY_SELECTORS found.
+		A selector is given as the attributes to match (ie: {"id": "content"}, {"class_": "body"}).
+		Only these elements are parsed (see SoupStrainer), not the whole page.
+		"""
+		for selector in self.BODY_SELECTORS:
+			soup     = BeautifulSoup(html, "lxml", parse_only=get_strainer(selector))
+			# the matching elements, without the doctype which is always kept
+			elements = soup.find_all(recursive=False)
+			if elements:
+				return u"".join(unicode(element) for element in elements)
+		return u""
+
+	@property
+	def http(self):
+		""" the HTTP client to use for every request, shared by the channels (see brokenpromises.httpclient) """
+		return brokenpromises.httpclient.get_http_client()
+
+	def get_query(self, keywords):
+		""" the query which searches any of the keywords """
+		raise Exception("need to be implemented")
+
+	def plan_queries(self, keywords):
+		"""
+		Groups the keywords (ie: the phrasings of a date) so that each group is
+		searched by a single query, shorter than QUERY_MAX_LENGTH.
+		Returns the list of the groups, in the order of the keywords.
+		"""
+		groups = []
+		group  = []
+		for keyword in keywords:
+			if group and len(self.get_query(group + [keyword])) > self.QUERY_MAX_LENGTH:
+				groups.append(group)
+				group = []
+			group.append(keyword)
+		if group:
+			groups.append(group)
+		return groups
+
+	def plan_date_queries(self, year, month=None, day=None):
+		"""
+		The queries which search the date, in its formats chosen by select_formats()
+		and grouped by plan_queries(). Returns the queries and the searched
+		(format, phrasing), see count_formats_hits().
+		"""
+		all_formats = list(brokenpromises.utils.iter_date_formats(year, month, day))
+		formats     = self.select_formats(all_formats)
+		groups      = self.plan_queries([phrasing for format, phrasing in formats])
+		searched    = set(sum(groups, []))
+		# a query by phrasing accepted by the channel (see plan_queries), without selection nor grouping
+		searchable  = sum(self.plan_queries([phrasing for format, phrasing in all_formats]), [])
+		self.api_calls_saved += len(searchable) - len(groups)
+		return [self.get_query(_) for _ in groups], [(format, phrasing) for format, phrasing in formats if phrasing in searched]
+
+	def select_formats(self, formats):
+		"""
+		The (format, phrasing) to search. With storage, a format whose recent hit rate
+		is under settings.FORMATS_MIN_HIT_RATE (see Storage.update_formats_stats) is
+		skipped, except sometimes (settings.FORMATS_REPROBE) in order to notice when
+		it becomes useful. The formats are only skipped if it saves a query.
+		"""
+		if not self.storage:
+			return formats
+		stats    = self.storage.get_formats_stats(self.__module__.split(".")[-1])
+		selected = []
+		for format, phrasing in formats:
+			stat   = stats.get(format, {})
+			trials = stat.get("trials", 0)
+			rate   = stat.get("rate", float(stat.get("hits", 0)) / trials if trials else 0.)
+			if trials < settings.FORMATS_MIN_TRIALS or rate >= settings.FORMATS_MIN_HIT_RATE \
+			or random.random() < settings.FORMATS_REPROBE:
+				selected.append((format, phrasing))
+		# at least one format is searched
+		selected = selected or formats[:1]
+		if len(self.plan_queries([_ for format, _ in selected])) >= len(self.plan_queries([_ for format, _ in formats])):
+			# the skipped formats would be searched in the same queries
+			return formats
+		return selected
+
+	def count_formats_hits(self, formats, articles, hits):
+		"""
+		adds to `hits` ({format: count}) the new articles whose text contains the phrasing of the format.
+		The text is the filtered one, the phrasing in the markup, a script or a filtered element doesn't count.
+		"""
+		bodies = [self.apply_filters(article.body).lower() for article in articles if article.body]
+		for format, phrasing in formats:
+			phrasing     = phrasing.lower()
+			hits[format] = hits.get(format, 0) + len([body for body in bodies if phrasing in body])
+		return hits
+
+	def record_formats_hits(self, hits):
+		""" saves the hits of the searched formats at the end of a collect, see select_formats() """
+		if self.storage and hits:
+			self.storage.update_formats_stats(self.__module__.split(".")[-1], hits)
+
+	def request_api(self, query, end_date=None, start_date=None, page=0):
+		""" the response of the API for the given page (from 0) of the query results, None for an error """
 		raise Exception("need to be implemented")
 
+	def read_page(self, response):
+		""" returns the results of a response of the API, and whether its page is the last one """
+		raise Exception("need to be implemented")
+
+	def reset_pages_budget(self):
+		""" to call at the beginning of a collect """
+		self.pages_left       = self.PAGES_BUDGET if self.PAGES_BUDGET is not None else settings.PAGES_BUDGET
+		self.budget_exhausted = False
+
+	def iter_pages(self, query, end_date=None, start_date=None, deadline=None):
+		"""
+		yields the results of the query page by page. A page is only requested once
+		the previous one is consumed, so that the caller stops the requests by stopping
+		the iteration (ie: when a page brings only known articles). After the first one,
+		the pages are taken from the budget of the collect (see reset_pages_budget()),
+		a page left unread once it is spent sets `budget_exhausted`.
+		No page is requested after the deadline: the collect has left the channel behind.
+		"""
+		page = 0
+		while True:
+			if deadline and time.time() > deadline:
+				return
+			response = self.request_api(query, end_date=end_date, start_date=start_date, page=page)
+			if not response:
+				return
+			results, last = self.read_page(response)
+			yield results
+			if last:
+				return
+			if self.pages_left <= 0:
+				warning("pages budget exhausted, the next pages of %s are not read" % (query))
+				self.budget_exhausted = True
+				return
+			self.pages_left -= 1
+			page            += 1
+
+	def call_api(self, params):
+		""" request to the API of the channel (URI), each attempt being counted (see spend_api_call()) """
+		response = self.http.get(self.URI, params=params, before_attempt=self.spend_api_call)
+		if getattr(response, "from_cache", False):
+			# answered by requests_cache (see settings), the API wasn't called
+			self.refund_api_call()
+		return response
+
+	def spend_api_call(self):
+		"""
+		to call before each request to the API, retries included since they are billed too:
+		raises QuotaExceeded once the DAILY_QUOTA is spent, and waits to respect the RATE_LIMIT
+		"""
+		if self.DAILY_QUOTA and not brokenpromises.quota.get_quota_ledger().spend(
+				self.__module__.split(".")[-1], self.DAILY_QUOTA, self.priority):
+			raise brokenpromises.quota.QuotaExceeded("daily quota of %s spent (%s priority)" % (self.__module__, self.priority))
+		self.throttle()
+		self.api_calls += 1
+
+	def refund_api_call(self):
+		""" gives back what spend_api_call() took for a call which didn't reach the API """
+		if self.DAILY_QUOTA:
+			brokenpromises.quota.get_quota_ledger().refund(self.__module__.split(".")[-1])
+		if self.limiter:
+			self.limiter.refund()
+		self.api_calls -= 1
+
+	def throttle(self):
+		""" to call before each request to the channel, waits to respect its RATE_LIMIT """
+		if self.limiter:
+			self.limiter.acquire()
+
+	def get_stored_articles(self, urls):
+		""" the stored articles with one of these urls, by url (one query for all) """
+		if not self.storage or not urls:
+			return {}
+		return self.storage.get_articles_by_url(urls)
+
+	def is_body_fresh(self, article, stored):
+		""" the body of the stored article can be reused for this article """
+		if not stored or not stored.body:
+			return False
+		scraped = stored.scraped or stored.created
+		if datetime.datetime.now() - scraped > datetime.timedelta(days=settings.BODY_MAX_AGE):
+			return False
+		# modified since the scrap
+		return not (article.last_modified and article.last_modified > scraped)
+
+	def retrieve_body(self, article, stored=None):
+		"""
+		set the body of the article: the stored one if it is still fresh, or scraped.
+		The stored body is also kept when the page answers it didn't change (304),
+		and is then fresh again, or with an error (the article is left without body
+		if none is stored).
+		"""
+		if self.is_body_fresh(article, stored):
+			return self.reuse_stored_body(article, stored)
+		response = self.get_page(article.url, stored)
+		if response.status_code == 304 and stored and stored.body:
+			self.reuse_stored_body(article, stored)
+			# checked now, and a 304 can also give new validators
+			article.scraped            = datetime.datetime.now()
+			article.etag               = response.headers.get("etag") or article.etag
+			article.http_last_modified = response.headers.get("last-modified") or article.http_last_modified
+			return article.body
+		if response.status_code != 200:
+			warning("%s returns %d" % (article.url, response.status_code))
+			if stored and stored.body:
+				return self.reuse_stored_body(article, stored)
+			article.body = None
+			return None
+		article.body               = self.extract_body(response.text)
+		article.etag               = response.headers.get("etag")
+		article.http_last_modified = response.headers.get("last-modified")
+		article.scraped            = datetime.datetime.now()
+		article.extraction_key     = None
+		return article.body
+
+	def reuse_stored_body(self, article, stored):
+		"""
+		set the stored body, its validators and its references to the article. The references
+		are not extracted again as long as the extraction key stays the same (see
+		CollectArticles.retrieve_articles_referenced_dates())
+		"""
+		article.body               = stored.body
+		article.scraped            = stored.scraped or stored.created
+		article.etag               = stored.etag
+		article.http_last_modified = stored.http_last_modified
+		article.ref_dates          = stored.ref_dates
+		article.extraction_key     = stored.extraction_key
+		return article.body
+
+	def retrieve_bodies(self, articles, stored={}):
+		""" retrieve_body() of the articles, the pages being scraped by settings.SCRAPING_THREADS threads """
+		if settings.SCRAPING_THREADS <= 1 or len(articles) <= 1:
+			return [self.retrieve_body(article, stored.get(article.url)) for article in articles]
+		pool = ThreadPool(min(settings.SCRAPING_THREADS, len(articles)))
+		try:
+			return pool.map(lambda article: self.retrieve_body(article, stored.get(article.url)), articles)
+		finally:
+			pool.close()
+			pool.join()
+
 # -----------------------------------------------------------------------------
 #
 # MODULE functions
 #
 # -----------------------------------------------------------------------------
+def get_strainer(selector):
+	"""
+	returns the SoupStrainer which keeps the elements matching the selector while parsing.
+	The parser gives it the class attribute as a string ("story-body articleBody"),
+	so a class is looked up as a word of this string, as find_all(class_=...) would do.
+	"""
+	selector = dict(selector)
+	if isinstance(selector.get("class_"), basestring):
+		selector["class_"] = re.compile(r"(^|\s)%s(\s|$)" % (re.escape(selector["class_"])))
+	return SoupStrainer(**selector)
+
 import importlib, pkgutil, sys
 
 def get_available_channels():
@@ -114,4 +526,220 @@ def __import_channels_from_string(val):
 	module_name = val.split('.')[-1]
 	return Catalogue.CHANNELS[module_name]['class']
 
+FILTERS = {} # channel module -> its channel's (apply_filters, FILTERS_VERSION), shared by the process
+
+def resolve_channel_filters(val):
+	""" returns the (apply_filters, FILTERS_VERSION) of the given channel module, resolved once per process """
+	filters = FILTERS.get(val)
+	if filters is None:
+		channel = perform_channels_import((val,))[0]()
+		filters = FILTERS[val] = (channel.apply_filters, channel.FILTERS_VERSION)
+	return filters
+
+def get_channel_filters(val):
+	return resolve_channel_filters(val)[0]
+
+def get_filters_version(val):
+	return resolve_channel_filters(val)[1]
+
+# -----------------------------------------------------------------------------
+#
+# TESTS
+#
+# -----------------------------------------------------------------------------
+import unittest
+
+class FakeResponse(object):
+
+	def __init__(self, status_code, text, headers={}):
+		self.status_code = status_code
+		self.text        = text
+		self.headers     = headers
+
+class TestChannel(unittest.TestCase):
+	'''Test Class'''
+
+	def test_token_bucket(self):
+		bucket = TokenBucket(100)
+		start  = time.time()
+		pool   = ThreadPool(4)
+		pool.map(lambda _: bucket.acquire(), range(21))
+		pool.close()
+		# the first token is available at once, then 100 per second
+		assert 0.19 <= time.time() - start < 0.5, time.time() - start
+		# a token given back is available at once
+		bucket = TokenBucket(1)
+		start  = time.time()
+		bucket.acquire()
+		bucket.refund()
+		bucket.acquire()
+		assert time.time() - start < 0.1, time.time() - start
+
+	def test_pickle(self):
+		import pickle
+		from brokenpromises.channels.guardian import TheGuardian
+		# the collectors are enqueued in rq with their channels
+		channel = pickle.loads(pickle.dumps(TheGuardian()))
+		channel.throttle()
+		assert channel.limiter.rate == TheGuardian.RATE_LIMIT
+
+	def test_select_formats(self):
+		class FakeStorage(object):
+			stats = {
+				"{month} {year}"   : {"trials": 50, "hits": 3},
+				"{month}, {year}"  : {"trials": 10000, "hits": 1},
+			}
+			def get_formats_stats(self, channel):
+				return self.stats
+		class FakeChannel(Channel):
+			# a query by phrasing
+			QUERY_MAX_LENGTH = 15
+			def get_query(self, keywords):
+				return " OR ".join("\"%s\"" % (keyword) for keyword in keywords)
+		formats = list(brokenpromises.utils.iter_date_formats(2014, 3))
+		storage = FakeStorage()
+		channel = FakeChannel(storage=storage)
+		reprobe = settings.FORMATS_REPROBE
+		settings.FORMATS_REPROBE = 0
+		try:
+			assert channel.select_formats(formats) == [("{month} {year}", "March 2014")]
+			# the rate is the recent one
+			storage.stats = {"{month} {year}": {"trials": 50, "hits": 40, "rate": 0}, "{month}, {year}": {"trials": 50, "hits": 3}}
+			assert channel.select_formats(formats) == [("{month}, {year}", "March, 2014")]
+			# no query saved
+			channel.QUERY_MAX_LENGTH = 500
+			assert channel.select_formats(formats) == formats
+			channel.QUERY_MAX_LENGTH = 15
+			settings.FORMATS_REPROBE = 1
+			assert channel.select_formats(formats) == formats
+		finally:
+			settings.FORMATS_REPROBE = reprobe
+		assert Channel().select_formats(formats) == formats
+
+	def test_count_formats_hits(self):
+		from brokenpromises import Article
+		articles = [Article(body="<p>Due in March 2014.</p>"), Article(body="<p>In march, 2014 or March 2014</p>"), Article(),
+		            Article(body="<p title='March 2014'>Soon<script>var d = 'March 2014';</script></p>")]
+		hits     = Channel().count_formats_hits(list(brokenpromises.utils.iter_date_formats(2014, 3)), articles, {})
+		assert hits == {"{month} {year}": 2, "{month}, {year}": 1}, hits
+
+	def test_retrieve_bodies(self):
+		from brokenpromises import Article
+		class FakeChannel(Channel):
+			RATE_LIMIT     = 50
+			BODY_SELECTORS = ({"name": "p"},)
+			def get_page(self, url, stored=None):
+				self.throttle()
+				time.sleep(0.05)
+				return FakeResponse(200, "<p>%s</p>" % (url))
+		articles = [Article(url=str(i)) for i in range(10)]
+		stored   = {"3": Article(url="3", body="<p>stored</p>", scraped=datetime.datetime.now())}
+		start    = time.time()
+		bodies   = FakeChannel().retrieve_bodies(articles, stored)
+		assert bodies == ["<p>%s</p>" % (i) for i in range(3)] + ["<p>stored</p>"] + ["<p>%s</p>" % (i) for i in range(4, 10)], bodies
+		# the 9 pages are scraped concurrently, within the rate limit
+		assert 0.16 <= time.time() - start < 0.45, time.time() - start
+
+	def test_retrieve_body_revalidated(self):
+		from brokenpromises import Article
+		class FakeChannel(Channel):
+			BODY_SELECTORS = ({"name": "p"},)
+			def get_page(self, url, stored=None):
+				if stored.etag == '"v1"':
+					return FakeResponse(304, "", {"last-modified": "Wed, 20 Nov 2013 10:00:00 GMT"})
+				if stored.etag == '"v2"':
+					return FakeResponse(404, "<p>Not found</p>")
+				return FakeResponse(200, "<p>New</p>", {"etag": '"v3"'})
+		old     = datetime.datetime.now() - datetime.timedelta(days=settings.BODY_MAX_AGE + 1)
+		stored  = Article(url="a", body="<p>Stored</p>", scraped=old, etag='"v1"', ref_dates=[{"date": (2014, 1, None)}],
+		                  extraction_key="abc")
+		article = Article(url="a")
+		channel = FakeChannel()
+		# not modified: the stored body and its references are kept, and fresh until BODY_MAX_AGE
+		assert channel.retrieve_body(article, stored) == "<p>Stored</p>"
+		assert (article.etag, article.extraction_key) == ('"v1"', "abc"), article.__dict__
+		assert article.ref_dates == [{"date": (2014, 1, None)}]
+		assert article.http_last_modified == "Wed, 20 Nov 2013 10:00:00 GMT"
+		assert article.scraped > old and channel.is_body_fresh(Article(url="a"), article)
+		# an error doesn't replace the stored body, nor makes it fresh
+		stored.etag = '"v2"'
+		assert channel.retrieve_body(article, stored) == "<p>Stored</p>" and article.scraped == old
+		assert channel.retrieve_body(Article(url="a"), Article(url="a", etag='"v2"')) is None
+		stored.etag = '"v0"'
+		assert channel.retrieve_body(article, stored) == "<p>New</p>" and article.etag == '"v3"'
+		assert article.scraped > old and article.extraction_key is None
+
+	def test_iter_pages(self):
+		class FakeChannel(Channel):
+			PAGES_BUDGET = 2
+			requested    = []
+			def request_api(self, query, end_date=None, start_date=None, page=0):
+				self.requested.append(page)
+				return {"results": [page], "last": page == 3}
+			def read_page(self, response):
+				return response["results"], response["last"]
+		channel = FakeChannel()
+		channel.reset_pages_budget()
+		# the second query only gets its first page
+		assert list(channel.iter_pages("a")) == [[0], [1], [2]]
+		assert list(channel.iter_pages("b")) == [[0]]
+		assert channel.budget_exhausted
+		# all the pages read within the budget
+		channel.PAGES_BUDGET = 3
+		channel.reset_pages_budget()
+		assert list(channel.iter_pages("a")) == [[0], [1], [2], [3]]
+		assert not channel.budget_exhausted
+		channel.PAGES_BUDGET = 2
+		channel.reset_pages_budget()
+		channel.requested = []
+		# a page is requested only when the previous one is consumed
+		for results in channel.iter_pages("a"):
+			break
+		assert channel.requested == [0], channel.requested
+		assert not channel.budget_exhausted
+		# nothing after the deadline
+		assert list(channel.iter_pages("a", deadline=time.time() - 1)) == []
+		assert channel.requested == [0], channel.requested
+
+	def test_call_api_quota(self):
+		class FakeResponse(str):
+			from_cache = True
+		class FakeClient(object):
+			def get(self, url, params, before_attempt):
+				# a request retried once
+				for attempt in range(params == "retried" and 2 or 1):
+					before_attempt()
+				return params
+		class FakeChannel(Channel):
+			URI         = "http://api"
+			DAILY_QUOTA = 5
+			http        = FakeClient()
+		ledger = brokenpromises.quota.QUOTA_LEDGER
+		brokenpromises.quota.QUOTA_LEDGER = brokenpromises.quota.LocalQuotaLedger()
+		try:
+			scheduled = FakeChannel(priority=brokenpromises.quota.LOW)
+			# the retry is counted, not the response from the cache
+			assert [scheduled.call_api(_) for _ in (0, "retried", FakeResponse("cached"), 3)] == [0, "retried", "cached", 3]
+			# the last call of the quota is left to the users
+			self.assertRaises(brokenpromises.quota.QuotaExceeded, scheduled.call_api, 4)
+			assert FakeChannel().call_api(4) == 4
+			self.assertRaises(brokenpromises.quota.QuotaExceeded, FakeChannel().call_api, 5)
+			assert scheduled.api_calls == 4
+		finally:
+			brokenpromises.quota.QUOTA_LEDGER = ledger
+
+	def test_extract_body(self):
+		class FakeChannel(Channel):
+			BODY_SELECTORS = ({"id": "body"}, {"class_": "part"})
+		html = "<html><head><script>var a;</script></head><body><p class='part'>One</p><div><p class='first part'>Two <b>2</b></p></div><p class='parts'>Footer</p></body></html>"
+		assert FakeChannel().extract_body(html) == u"<p class=\"part\">One</p><p class=\"first part\">Two <b>2</b></p>", FakeChannel().extract_body(html)
+		html = "<!DOCTYPE html><html><body><div id='body'><p class='part'>One</p></div><p class='part'>Two</p></body></html>"
+		assert FakeChannel().extract_body(html) == u"<div id=\"body\"><p class=\"part\">One</p></div>", FakeChannel().extract_body(html)
+		assert FakeChannel().extract_body("<html><body><p>Nothing</p></body></html>") == u""
+
+if __name__ == "__main__":
+	# unittest.main()
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestChannel)
+	unittest.TextTestRunner(verbosity=2).run(suite)
+
 # EOF
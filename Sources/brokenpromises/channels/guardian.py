@@ -31,10 +31,7 @@ from brokenpromises.channels import Channel, channel
 import brokenpromises.utils  as utils
 import datetime
 import reporter
-import requests
 import re
-import time
-from bs4 import BeautifulSoup
 
 debug, trace, info, warning, error, fatal = reporter.bind(__name__)
 
@@ -46,49 +43,97 @@ class TheGuardian(Channel):
 		5,000   Calls per day
 	"""
 
-	URI     = "http://content.guardianapis.com/search"
-	API_KEY = settings.BP_CHANNEL_GUARDIAN_API_KEY
+	URI         = "http://content.guardianapis.com/search"
+	API_KEY     = settings.BP_CHANNEL_GUARDIAN_API_KEY
+	RATE_LIMIT  = 12 # calls per second
+	DAILY_QUOTA = 5000 # calls per day
 
-	def get_articles(self, year, month=None, day=None):
-		different_date_formats = utils.get_all_date_formats(year, month, day)
-		articles = []
-		for format in different_date_formats:
-			response = self.request_api(keyword=format, end_date=utils.get_the_date_before(year, month, day))
-			if response:
-				for article in response['response']['results']:
+	# comments
+	FILTERS_CLASSES = ("element-comment",)
+	# all the blockquotes (for tweet).
+	# TODO: Should preserve a date inside the quote.
+	FILTERS_TAGS    = Channel.FILTERS_TAGS + ("blockquote",)
+	# amendment notes
+	FILTERS_TEXTS   = (re.compile("was (changed|amended|edited) on"),)
+	# articles, then live blogs
+	BODY_SELECTORS  = ({"id": "article-body-blocks"}, {"id": "live-blog-blocks"})
+
+	def iter_articles(self, year, month=None, day=None, since=None, deadline=None):
+		end_date = utils.get_the_date_before(year, month, day)
+		if since and since > end_date:
+			# nothing can be published in this window
+			return
+		urls             = set()
+		queries, formats = self.plan_date_queries(year, month, day)
+		hits             = dict((format, 0) for format, phrasing in formats)
+		self.reset_pages_budget()
+		for query in queries:
+			for results in self.iter_pages(query, end_date=end_date, start_date=since, deadline=deadline):
+				# the articles already scraped
+				stored   = self.get_stored_articles([_.get('webUrl') for _ in results if _.get('webUrl') not in urls])
+				articles = []
+				for article in results:
 					# escaping conditions
-					if article.get('web_url') in [_.url for _ in articles] :
+					if article.get('webUrl') in urls:
 						# this url is already added in the response
 						continue
+					fields = article.get('fields') or {}
 					a = Article(TheGuardian.__module__)
 					a.url      = article.get('webUrl')
 					a.title    = article.get('webTitle')
 					a.source   = "The Guardian"
 					a.pub_date = datetime.datetime.strptime(article.get('webPublicationDate'), "%Y-%m-%dT%H:%M:%SZ")
-					a.snippet  = article.get('fields').get('trailText')
+					a.snippet  = fields.get('trailText')
+					if fields.get('lastModified'):
+						a.last_modified = datetime.datetime.strptime(fields['lastModified'], "%Y-%m-%dT%H:%M:%SZ")
+					# the body is given by the API
+					if fields.get('body'):
+						a.body    = fields['body']
+						a.scraped = datetime.datetime.now()
 					# a.images   = TODO
-					# scrape body from page
-					a.body     = self.scrape_body_article(a.url)
-					time.sleep(.11)
+					urls.add(a.url)
+					articles.append(a)
+				# the missing bodies from storage, or scraped from pages
+				self.retrieve_bodies([_ for _ in articles if not _.body], stored)
+				new_articles = [_ for _ in articles if _.url not in stored]
+				self.count_formats_hits(formats, new_articles, hits)
+				for a in articles:
 					if a.body:
-						articles.append(a)
+						yield a
 					else:
 						warning("no body for article %s" % (a.__dict__))
-						pass
-		return articles
+				if not new_articles:
+					# newest first: the next pages are known too
+					break
+		# the statistics of the searched formats, see select_formats()
+		self.record_formats_hits(hits)
+
+	def get_query(self, keywords):
+		return " OR ".join("\"%s\"" % (keyword) for keyword in keywords)
 
-	def request_api(self, keyword, end_date=None):
+	def plan_queries(self, keywords):
+		# the API refuses the commas in `q`, and a phrase is searched without its
+		# punctuation anyway ("October 2013" finds "October, 2013")
+		return super(TheGuardian, self).plan_queries([_ for _ in keywords if "," not in _])
+
+	def request_api(self, query, end_date=None, start_date=None, page=0):
 		payload  = {
 			"api-key"     : TheGuardian.API_KEY,
-			"q"           : "\"%s\"" % (keyword),
-			"show-fields" : "all",
+			"q"           : query,
+			# only the fields used by iter_articles
+			"show-fields" : "body,trailText,lastModified",
 			# section list here: http://content.guardianapis.com/sections
 			"section"     : "-fashion,-music,-artanddesign,-film,-guardian-masterclasses",
-			"page-size"   : 50 # maximum
+			"page-size"   : 50, # maximum
+			"page"        : page + 1,
+			# the known articles come last, see iter_articles()
+			"order-by"    : "newest"
 		}
 		if end_date:
 			payload['to-date'] = end_date.strftime("%Y-%m-%d")
-		r = requests.get(TheGuardian.URI, params=payload)
+		if start_date:
+			payload['from-date'] = start_date.strftime("%Y-%m-%d")
+		r = self.call_api(payload)
 		if r.status_code != 200:
 			if r.text and r.json()['response']['message'] == "only one value allowed in q parameter":
 				# error known
@@ -98,25 +143,9 @@ class TheGuardian(Channel):
 				return None
 		return r.json()
 
-	def apply_filters(self, body):
-		body = super(TheGuardian, self).apply_filters(body)
-		body = BeautifulSoup(body)
-		# remove comments
-		map(lambda _:_.decompose(), body.find_all(class_="element-comment"))
-		# remove all the blockquotes (for tweet).
-		# TODO: Should preserve a date inside the quote.
-		map(lambda _:_.decompose(), body.find_all("blockquote"))
-		map(lambda _:_.decompose(), body.find_all("script"))
-		map(lambda _:_.extract(), body.find_all(text=re.compile("was (changed|amended|edited) on")))
-		return unicode(body)
-
-	def scrape_body_article(self, url, filter_=False):
-		r       = requests.get(url)
-		soup    = BeautifulSoup(r.text, 'lxml')
-		article = soup.find(id='article-body-blocks') or soup.find(id='live-blog-blocks')
-		if filter_:
-			article = self.apply_filters(unicode(article))
-		return unicode(article)
+	def read_page(self, response):
+		response = response['response']
+		return response['results'], response['currentPage'] >= response['pages']
 
 # -----------------------------------------------------------------------------
 #
@@ -143,6 +172,65 @@ class TestTheGuardian(unittest.TestCase):
 			assert article.body is not None, article
 			# print article.url
 
+	def test_get_articles_since(self):
+		# published since the searched date: no request is sent
+		assert self.obj.get_articles(2013, 12, since=datetime.date(2013, 12, 2)) == []
+
+	def test_iter_articles_pages(self):
+		class FakeGuardian(TheGuardian):
+			def request_api(self, query, end_date=None, start_date=None, page=0):
+				self.requested.append(page)
+				urls = (("a", "b"), ("c",), ("a", "b"), ("d",))[page]
+				results = [{"webUrl": url, "webTitle": url, "webPublicationDate": "2013-11-03T10:00:00Z", "fields": {"body": "<p>%s</p>" % (url)}} for url in urls]
+				return {"response": {"results": results, "currentPage": page + 1, "pages": 4}}
+		channel = FakeGuardian()
+		channel.requested = []
+		# stops at the third page which brings only known articles
+		assert [_.url for _ in channel.get_articles(2013, 12)] == ["a", "b", "c"]
+		assert channel.requested == [0, 1, 2], channel.requested
+		# within the budget of pages
+		channel.PAGES_BUDGET = 1
+		channel.requested    = []
+		assert [_.url for _ in channel.get_articles(2013, 12)] == ["a", "b", "c"]
+		assert channel.requested == [0, 1], channel.requested
+
+	def test_plan_queries(self):
+		formats = utils.get_all_date_formats(2013, 10, 10)
+		queries = self.obj.plan_queries(formats)
+		assert queries == [[_ for _ in formats if "," not in _]], queries
+		assert self.obj.get_query(["10 October 2013", "2013-10-10"]) == "\"10 October 2013\" OR \"2013-10-10\""
+		self.obj.QUERY_MAX_LENGTH = 100
+		queries = self.obj.plan_queries(formats)
+		assert len(queries) > 1 and all(len(self.obj.get_query(_)) <= 100 for _ in queries), queries
+		assert sum(queries, []) == [_ for _ in formats if "," not in _]
+		# the phrasings refused by the API are not counted as saved calls
+		self.obj.api_calls_saved = 0
+		queries, searched = self.obj.plan_date_queries(2013, 10, 10)
+		assert self.obj.api_calls_saved == len([_ for _ in formats if "," not in _]) - len(queries), self.obj.api_calls_saved
+
+	def test_retrieve_body_from_storage(self):
+		stored  = Article(TheGuardian.__module__, url="http://a", body="<p>Stored</p>", scraped=datetime.datetime.now())
+		article = Article(TheGuardian.__module__, url="http://a", last_modified=datetime.datetime.now() - datetime.timedelta(days=1))
+		assert self.obj.retrieve_body(article, stored) == "<p>Stored</p>"
+		assert article.scraped == stored.scraped
+		# modified since the scrap, or scraped too long ago
+		article.last_modified = datetime.datetime.now()
+		assert not self.obj.is_body_fresh(article, stored)
+		article.last_modified = None
+		stored.scraped        = datetime.datetime.now() - datetime.timedelta(days=settings.BODY_MAX_AGE + 1)
+		assert not self.obj.is_body_fresh(article, stored)
+
+	def test_apply_filters_rules(self):
+		body = """<div id="article-body-blocks"><p>The bridge is due in <b>March 2014</b>.</p>
+			<div class="block element-comment">Comment of 2015</div><blockquote>A tweet about 2016</blockquote>
+			<script>var year = 2017;</script><!-- 2018 --><p><em>This article was amended on 3 November 2013</em></p>
+			<p>The end.</p></div>"""
+		body = self.obj.apply_filters(body)
+		assert "The bridge is due in March 2014." in body, body
+		assert "The end." in body, body
+		for removed in ("2013", "2015", "2016", "2017", "2018", "<"):
+			assert removed not in body, body
+
 	def test_apply_filters(self):
 		contains = """This article was amended on 3 November 2013""" # and should be filtered
 		url      = "http://www.theguardian.com/politics/2013/nov/03/gerry-adams-jean-mcconville"
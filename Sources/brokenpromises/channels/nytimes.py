@@ -31,15 +31,9 @@ from brokenpromises.channels import Channel, channel
 import brokenpromises.utils  as utils
 import datetime
 import reporter
-import requests
-import time
-from bs4 import BeautifulSoup
 
 debug, trace, info, warning, error, fatal = reporter.bind(__name__)
 
-# TODO
-#   [ ] handle pagination
-
 @channel("The New-York Times")
 class NewYorkTimes(Channel):
 	"""
@@ -52,21 +46,35 @@ class NewYorkTimes(Channel):
 			10,000  Calls per day
 	"""
 
-	URI     = "http://api.nytimes.com/svc/search/v2/articlesearch.json"
-	API_KEY = settings.BP_CHANNEL_NYTIMES_API_KEY
-
-	def get_articles(self, year, month=None, day=None):
-		different_date_formats = utils.get_all_date_formats(year, month, day)
-		articles = []
-		for format in different_date_formats:
-			response = self.request_api(keyword=format, end_date=utils.get_the_date_before(year, month, day))
-			if response:
-				for article in response['response']['docs']:
+	URI         = "http://api.nytimes.com/svc/search/v2/articlesearch.json"
+	API_KEY     = settings.BP_CHANNEL_NYTIMES_API_KEY
+	RATE_LIMIT  = 10 # calls per second
+	DAILY_QUOTA = 10000 # calls per day
+
+	# every paragraph of the article
+	BODY_SELECTORS = ({"class_": "articleBody"},)
+
+	def iter_articles(self, year, month=None, day=None, since=None, deadline=None):
+		end_date = utils.get_the_date_before(year, month, day)
+		if since and since > end_date:
+			# nothing can be published in this window
+			return
+		urls             = set()
+		queries, formats = self.plan_date_queries(year, month, day)
+		hits             = dict((format, 0) for format, phrasing in formats)
+		self.reset_pages_budget()
+		for query in queries:
+			for results in self.iter_pages(query, end_date=end_date, start_date=since, deadline=deadline):
+				unseen   = [_.get('web_url') for _ in results if _.get('web_url') not in urls]
+				# the articles already scraped
+				stored   = self.get_stored_articles(unseen)
+				articles = []
+				for article in results:
 					# escaping conditions
 					if article.get('document_type') not in ('article', 'blog'):
 						# it's not an article
 						continue
-					if article.get('web_url') in [_.url for _ in articles] :
+					if article.get('web_url') in urls:
 						# this url is already added in the response
 						continue
 					a = Article(NewYorkTimes.__module__)
@@ -76,33 +84,43 @@ class NewYorkTimes(Channel):
 					a.pub_date = datetime.datetime.strptime(article.get('pub_date'), "%Y-%m-%dT%H:%M:%SZ")
 					a.snippet  = article.get('snippet')
 					# a.images   = TODO
-					# scrape body from page
-					a.body     = self.scrape_body_article(a.url)
-					time.sleep(.11)
+					urls.add(a.url)
 					articles.append(a)
-		return articles
-
-	def request_api(self, keyword, end_date=None):
+				# bodies from storage, or scraped from pages
+				self.retrieve_bodies(articles, stored)
+				self.count_formats_hits(formats, [_ for _ in articles if _.url not in stored], hits)
+				for a in articles:
+					yield a
+				if not [_ for _ in unseen if _ not in stored]:
+					# newest first: the next pages are known too
+					break
+		# the statistics of the searched formats, see select_formats()
+		self.record_formats_hits(hits)
+
+	def get_query(self, keywords):
+		return "body:(%s)" % (" OR ".join("\"%s\"" % (keyword) for keyword in keywords))
+
+	def request_api(self, query, end_date=None, start_date=None, page=0):
 		payload  = {
 			"api-key" : NewYorkTimes.API_KEY,
-			"fq"      : "body:\"%s\"" % keyword,
+			"fq"      : query,
+			"page"    : page,
+			# the known articles come last, see iter_articles()
+			"sort"    : "newest",
 		}
 		if end_date:
 			payload['end_date'] = end_date.strftime("%Y%m%d")
-		r = requests.get(NewYorkTimes.URI, params=payload)
+		if start_date:
+			payload['begin_date'] = start_date.strftime("%Y%m%d")
+		r = self.call_api(payload)
 		if r.status_code != 200:
 			error("Nytimes returns an error for %s:\n %s\n%s" % (NewYorkTimes.URI, r.text, payload))
 			return None
 		return r.json()
 
-	def scrape_body_article(self, url, filter_=False):
-		r       = requests.get(url)
-		soup    = BeautifulSoup(r.text)
-		article = soup.find_all(class_='articleBody')
-		article = u"".join([str(a).decode("utf-8", 'ignore') for a in article])
-		if filter_:
-			article = self.apply_filters(article)
-		return unicode(article)
+	def read_page(self, response):
+		response = response['response']
+		return response['docs'], response['meta']['offset'] + len(response['docs']) >= response['meta']['hits']
 
 # -----------------------------------------------------------------------------
 #
@@ -129,6 +147,11 @@ class TestNewYorkTimes(unittest.TestCase):
 			assert article.body is not None
 			# print article.url
 
+	def test_plan_queries(self):
+		formats = utils.get_all_date_formats(2013, 10, 10)
+		assert self.obj.plan_queries(formats) == [formats]
+		assert self.obj.get_query(["10 October 2013", "2013-10-10"]) == "body:(\"10 October 2013\" OR \"2013-10-10\")"
+
 	def test_scrape_body_article(self):
 		body = self.obj.scrape_body_article("http://www.nytimes.com/2013/11/20/your-money/how-doctors-die.html?src=me&ref=general")
 		assert type(body) is unicode, type(body)
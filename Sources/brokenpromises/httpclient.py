@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# Encoding: utf-8
+# -----------------------------------------------------------------------------
+# Project : Broken Promises
+# -----------------------------------------------------------------------------
+# Author : Edouard Richard                                  <edou4rd@gmail.com>
+# -----------------------------------------------------------------------------
+# License : GNU General Public License
+# -----------------------------------------------------------------------------
+# Creation : 18-Oct-2026
+# Last mod : 18-Oct-2026
+# -----------------------------------------------------------------------------
+# This file is part of Broken Promises.
+#
+#     Broken Promises is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Broken Promises is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Broken Promises.  If not, see <http://www.gnu.org/licenses/>.
+
+from   brokenpromises import settings
+from   urlparse       import urlparse
+import requests
+import requests.adapters
+import random
+import threading
+import time
+import reporter
+
+debug, trace, info, warning, error, fatal = reporter.bind(__name__)
+
+__doc__ = """
+
+	HTTP client shared by the channels (see Channel.http): one session, so
+	the connections to a host are kept alive and reused, with a timeout on
+	every request and a few retries when the server is overloaded.
+
+"""
+
+# -----------------------------------------------------------------------------
+#
+#    HTTP client
+#
+# -----------------------------------------------------------------------------
+class HttpClient(object):
+	"""
+	`timeout`   : in seconds, to connect and to wait for the response
+	              (requests 2.0 uses the same value for both)
+	`retries`   : number of retries after a 429, a 5xx, a connection error or a timeout
+	`backoff`   : in seconds, the n-th retry waits a random time up to backoff * 2^n
+	              (or the Retry-After of a 429 if longer)
+	`pool_size` : connections kept alive by host
+	`max_retry_after` : in seconds, a response asking to wait longer (Retry-After) is returned
+	              without retry, the collect wouldn't wait for it (see settings.CHANNEL_DEADLINE)
+	"""
+
+	RETRY_STATUS = (429, 500, 502, 503, 504)
+
+	def __init__(self, timeout=20, retries=3, backoff=.5, pool_size=10, max_retry_after=60):
+		self.timeout = timeout
+		self.retries = retries
+		self.backoff = backoff
+		self.max_retry_after = max_retry_after
+		self.session = requests.Session()
+		adapter      = requests.adapters.HTTPAdapter(pool_maxsize=pool_size)
+		self.session.mount("http://" , adapter)
+		self.session.mount("https://", adapter)
+		self.lock    = threading.Lock()
+		self.metrics = {}
+
+	def get(self, url, before_attempt=None, **kwargs):
+		""" before_attempt : called before the request and each of its retries (ie: to count them in a quota) """
+		kwargs.setdefault("timeout", self.timeout)
+		host    = urlparse(url).netloc
+		attempt = 0
+		while True:
+			if before_attempt:
+				before_attempt()
+			start = time.time()
+			try:
+				response = self.session.get(url, **kwargs)
+			except (requests.ConnectionError, requests.Timeout) as e:
+				self.add_metrics(host, time.time() - start, error=True)
+				if attempt >= self.retries:
+					raise
+				warning("%s on %s, retry %d/%d" % (e.__class__.__name__, host, attempt + 1, self.retries))
+				delay = self.get_delay(attempt)
+			else:
+				self.add_metrics(host, time.time() - start, response=response)
+				if response.status_code not in HttpClient.RETRY_STATUS or attempt >= self.retries:
+					return response
+				delay = self.get_delay(attempt, response)
+				if delay is None:
+					warning("%s returns %d and asks to wait more than %ds, no retry" % (host, response.status_code, self.max_retry_after))
+					return response
+				warning("%s returns %d, retry %d/%d" % (host, response.status_code, attempt + 1, self.retries))
+			self.add_metrics(host, retry=True)
+			time.sleep(delay)
+			attempt += 1
+
+	def get_delay(self, attempt, response=None):
+		"""
+		random delay (full jitter), so the retries of the threads don't hit the server at once.
+		None if the server asks to wait more than max_retry_after.
+		"""
+		delay = random.uniform(0, self.backoff * 2 ** attempt)
+		retry_after = response is not None and response.headers.get("retry-after")
+		if retry_after and retry_after.isdigit():
+			if int(retry_after) > self.max_retry_after:
+				return None
+			delay = max(delay, int(retry_after))
+		return delay
+
+	# -----------------------------------------------------------------------------
+	#
+	#    Metrics
+	#
+	# -----------------------------------------------------------------------------
+	def add_metrics(self, host, duration=0, response=None, error=False, retry=False):
+		with self.lock:
+			metrics = self.metrics.setdefault(host, {
+				"host"       : host,
+				"requests"   : 0,
+				"errors"     : 0,
+				"retries"    : 0,
+				"from_cache" : 0,
+				"time"       : 0, # in seconds
+				"status"     : {}
+			})
+			if retry:
+				metrics["retries"] += 1
+				return
+			metrics["requests"] += 1
+			metrics["time"]     += duration
+			if error:
+				metrics["errors"] += 1
+			if response is not None:
+				# requests_cache (see settings) marks the responses it returns
+				metrics["from_cache"] += int(bool(getattr(response, "from_cache", False)))
+				status = str(response.status_code)
+				metrics["status"][status] = metrics["status"].get(status, 0) + 1
+
+	def get_metrics(self):
+		""" a list of the metrics by host """
+		with self.lock:
+			return [dict(_, time=round(_["time"], 3), status=dict(_["status"])) for _ in self.metrics.values()]
+
+	def reset_metrics(self):
+		with self.lock:
+			self.metrics = {}
+
+# -----------------------------------------------------------------------------
+#
+#    MODULE functions
+#
+# -----------------------------------------------------------------------------
+HTTP_CLIENT = None # shared by the process, see get_http_client()
+
+def get_http_client():
+	global HTTP_CLIENT
+	if HTTP_CLIENT is None:
+		HTTP_CLIENT = HttpClient(settings.HTTP_TIMEOUT, settings.HTTP_RETRIES, settings.HTTP_BACKOFF, settings.HTTP_POOL_SIZE,
+			settings.HTTP_MAX_RETRY_AFTER)
+	return HTTP_CLIENT
+
+# -----------------------------------------------------------------------------
+#
+# TESTS
+#
+# -----------------------------------------------------------------------------
+import unittest
+
+class TestHttpClient(unittest.TestCase):
+	'''Test Class'''
+
+	def setUp(self):
+		import BaseHTTPServer
+		responses = self.responses = []
+		class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+			def do_GET(self):
+				# a status, or a (status, headers)
+				status  = responses and responses.pop(0) or 200
+				headers = {}
+				if isinstance(status, tuple):
+					status, headers = status
+				self.send_response(status)
+				for header in headers.items():
+					self.send_header(*header)
+				self.send_header("Content-Length", "2")
+				self.end_headers()
+				self.wfile.write("ok")
+			def log_message(self, *args):
+				pass
+		self.server = BaseHTTPServer.HTTPServer(("127.0.0.1", 0), Handler)
+		self.url    = "http://127.0.0.1:%d/" % (self.server.server_port)
+		thread      = threading.Thread(target=self.server.serve_forever)
+		thread.daemon = True
+		thread.start()
+
+	def tearDown(self):
+		self.server.shutdown()
+		self.server.server_close()
+
+	def test_retries(self):
+		client   = HttpClient(timeout=2, retries=2, backoff=.01)
+		attempts = []
+		self.responses.extend([503, 429])
+		assert client.get(self.url, before_attempt=lambda: attempts.append(1)).status_code == 200
+		assert len(attempts) == 3
+		metrics = client.get_metrics()[0]
+		assert (metrics["requests"], metrics["retries"], metrics["status"]) == (3, 2, {"503": 1, "429": 1, "200": 1}), metrics
+		# the last response is returned when there is no retry left
+		self.responses.extend([500, 500, 500])
+		assert client.get(self.url).status_code == 500
+		client.reset_metrics()
+		assert client.get_metrics() == []
+
+	def test_retry_after(self):
+		client = HttpClient(timeout=2, retries=2, backoff=.01, max_retry_after=5)
+		self.responses.extend([(429, {"Retry-After": "3600"})])
+		start  = time.time()
+		# too long to wait: the response is returned at once
+		assert client.get(self.url).status_code == 429
+		assert time.time() - start < 1 and client.get_metrics()[0]["retries"] == 0
+
+	def test_connection_error(self):
+		import socket
+		# a port where nobody listens
+		sock   = socket.socket()
+		sock.bind(("127.0.0.1", 0))
+		url    = "http://127.0.0.1:%d/" % (sock.getsockname()[1])
+		sock.close()
+		client = HttpClient(timeout=1, retries=1, backoff=.01)
+		self.assertRaises(requests.ConnectionError, client.get, url)
+		assert client.get_metrics()[0]["errors"] == 2
+
+if __name__ == "__main__":
+	# unittest.main()
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestHttpClient)
+	unittest.TextTestRunner(verbosity=2).run(suite)
+
+# EOF
@@ -36,7 +36,7 @@ class Article(object):
 
 	def __init__(self, channel=None, title=None, url=None, source=None, body=None, 
 				 pub_date=None, ref_dates=[], images=[], headline=None, created=None, 
-				 *args, **kwargs):
+				 scraped=None, last_modified=None, etag=None, http_last_modified=None, extraction_key=None, *args, **kwargs):
 		self.title     = title
 		self.url       = url
 		self.source    = source
@@ -52,6 +52,14 @@ class Article(object):
 		self.headline  = headline
 		self.channel   = channel
 		self.created   = created or datetime.datetime.now()
+		# when the body was scraped, and the last modification given by the channel
+		self.scraped       = scraped
+		self.last_modified = last_modified
+		# validators of the scraped page (ETag and Last-Modified headers), to revalidate the body
+		self.etag               = etag
+		self.http_last_modified = http_last_modified
+		# key of the extraction which gave the ref_dates (see CollectArticles.get_extraction_key)
+		self.extraction_key     = extraction_key
 		# set extra fields, like _id from mongodb
 		for _k, _v in kwargs.items():
 			if not hasattr(self, _k):
@@ -27,50 +27,98 @@
 
 from brokenpromises         import settings, Report
 from brokenpromises.storage import Storage
+import brokenpromises.cache
 import brokenpromises.channels
+import brokenpromises.httpclient
+import brokenpromises.quota
+import brokenpromises.sentences
 import brokenpromises.utils
-import nltk
-import os
 import dateparser
 import datetime
 import calendar
+import bisect
+import multiprocessing
+import threading
+import Queue
+import time
 import reporter
 
 debug, trace, info, warning, error, fatal = reporter.bind(__name__)
 
+class Sentences(object):
+	""" Sentences of a text, segmented once, to find the one at a given position """
+
+	def __init__(self, text, spans):
+		self.text   = text
+		self.spans  = spans
+		self.starts = [start for start, end in spans]
+
+	def at(self, span):
+		""" returns the sentence containing the given (start, end) """
+		index = bisect.bisect_right(self.starts, span[0]) - 1
+		if index < 0:
+			return None
+		start, end = self.spans[index]
+		# the span can go on in the next sentences (ie: a wrong boundary)
+		while end < span[1] and index + 1 < len(self.spans):
+			index += 1
+			end    = self.spans[index][1]
+		return self.text[start:end]
+
 class Collector(object):
 
+	TOKENIZER           = None # shared by the whole process, see get_tokenizer()
+	TOKENIZER_LOAD_TIME = 0    # in seconds, spent to load the tokenizer in this process
+
 	def __init__(self):
 		self.report = None
 
 	@classmethod
-	def retrieve_referenced_dates(cls, text, filters_on_text=None):
+	def retrieve_referenced_dates(cls, text, filters_on_text=None, target=None, min_date=None):
+		"""
+		target   : only retrieve the references to this (year, month, day)
+		min_date : only retrieve the references posterior to this date
+		"""
 		references = []
 		# filters
 		# remove all tags
 		if filters_on_text:
 			text = filters_on_text(text)
 		# search and add dates to `refrences`
-		for date_obj, date_row, date_position in dateparser.find_dates(text):
+		sentences = None
+		for date_obj, date_row, date_position in dateparser.find_dates(text, target=target, min_date=min_date):
+			# segmented once, when the first date is found
+			sentences = sentences or cls.get_sentences(text)
 			reference = {
 				"date"           : date_obj,
-				"extract"        : cls.get_sentence(text, date_row),
+				"extract"        : sentences.at(date_position),
 				"extracted_date" : date_row
 			}
+			# the days covered by the date, for the range queries (see Storage.get_articles)
+			reference.update(brokenpromises.utils.get_reference_range(date_obj))
 			references.append(reference)
 		return references
 
+	@classmethod
+	def get_tokenizer(cls):
+		""" load the sentence splitter (settings.SENTENCE_SPLITTER) the first time it is needed in the process """
+		if Collector.TOKENIZER is None:
+			start = time.time()
+			Collector.TOKENIZER = brokenpromises.sentences.load(settings.SENTENCE_SPLITTER)
+			Collector.TOKENIZER_LOAD_TIME += time.time() - start
+		return Collector.TOKENIZER
+
+	@classmethod
+	def get_sentences(cls, text):
+		return Sentences(text, cls.get_tokenizer().span_tokenize(text))
+
 	@classmethod
 	def get_sentence(cls, text, search):
-		# TODO : DIY
-		tokenizer = nltk.data.load(
-			"file:%s" % (
-				os.path.join(os.path.dirname(__file__), "nltk_data/tokenizers/punkt/english.pickle")))
-		for sentence in tokenizer.sentences_from_text(text):
-			if search in sentence:
-				break
-			sentence = None
-		return sentence
+		""" returns the first sentence where `search` is """
+		position = text.find(search)
+		if position < 0:
+			return None
+		return cls.get_sentences(text).at((position, position + len(search)))
 
 	def set_report(self, **kwargs):
 		self.report           = Report()
@@ -119,6 +167,16 @@ class Collector(object):
 		results = filter(lambda _: _.ref_dates, results)
 		return results
 
+def retrieve_article_referenced_dates(task):
+	"""
+	Filters the body with its channel's filters and retrieves its references.
+	Used by the serial and the pool extraction of CollectArticles, so `task`
+	(channel, body, target, min_date) and the result have to be picklable.
+	"""
+	channel, body, target, min_date = task
+	filters = brokenpromises.channels.get_channel_filters(channel)
+	return Collector.retrieve_referenced_dates(body, filters_on_text=filters, target=target, min_date=min_date)
+
 # -----------------------------------------------------------------------------
 #
 #    Collect Articles
@@ -126,19 +184,36 @@ class Collector(object):
 # -----------------------------------------------------------------------------
 class CollectArticles(Collector):
 
-	CACHE_FOR_COLLECT = 31 # in days, if use_storage is True with force_collect as False
+	CACHE_FOR_COLLECT   = 31 # in days, if use_storage is True with force_collect as False
+	INCREMENTAL_OVERLAP = 1  # in days, articles published before the last collect but indexed after by the APIs
 
-	def __init__(self, channels, year, month=None, day=None, report_extra={}, use_storage=False, force_collect=False):
+	def __init__(self, channels, year, month=None, day=None, report_extra={}, use_storage=False, force_collect=False,
+				 searched_date_only=False, keep_results=True, incremental=False, priority=brokenpromises.quota.HIGH):
 		"""
-		force_collect : if use_storage is enable, force the collect even if there is already a report for this searched date
+		force_collect      : if use_storage is enable, force the collect even if there is already a report for this searched date
+		searched_date_only : only retrieve the references to the searched date, posterior to the article publication.
+		                     The other dates are skipped during the extraction instead of being filtered after.
+		keep_results       : run() returns the collected articles. Without it, only a batch of articles
+		                     (settings.COLLECT_BATCH_SIZE) is held in memory at a time.
+		incremental        : if use_storage is enable, only fetch the articles published since the last done report
+		                     for this searched date and channels. They are merged with the stored ones.
+		priority           : quota.LOW for the scheduled collects, which leave a reserve of the daily quotas
+		                     of the APIs to the searches asked by the users (see brokenpromises.quota)
 		"""
 		super(CollectArticles, self).__init__()
-		self.use_storage   = use_storage
-		self.channels      = [Channel() for Channel in brokenpromises.channels.perform_channels_import(channels)]
-		self.date          = (year and int(year) or None, month and int(month) or None, day and int(day) or None)
-		self.force_collect = force_collect
-		self.storage       = self.use_storage and Storage() or None
-		self.report_extra  = report_extra
+		self.use_storage        = use_storage
+		self.storage            = self.use_storage and Storage() or None
+		self.priority           = priority
+		self.channels           = [Channel(storage=self.storage, priority=self.priority) for Channel in brokenpromises.channels.perform_channels_import(channels)]
+		self.date               = (year and int(year) or None, month and int(month) or None, day and int(day) or None)
+		self.force_collect      = force_collect
+		self.searched_date_only = searched_date_only
+		self.keep_results       = keep_results
+		self.incremental        = incremental
+		# by channel name, filled by fetch_articles()
+		self.channels_timings   = {}
+		self.channels_errors    = {}
+		self.report_extra       = report_extra
 
 	def run(self, **kwargs):
 		if self.use_storage and not self.force_collect:
@@ -165,46 +240,257 @@ class CollectArticles(Collector):
 					self.report.meta.update(self.report_extra)
 					self.storage.save_report(self.get_report())
 					# return articles and skip a new collect
-					return articles
-
-		articles = []
-		# retrieve articles from channels
-		for channel in self.channels:
-			articles += channel.get_articles(*self.date)
-		# pre-filters
-		articles = self.pre_filter(articles)
-		# search dates in the body articles
-		for result in articles:
-			filters = brokenpromises.channels.perform_channels_import((result.channel,))[0]().apply_filters
-			result.ref_dates = self.retrieve_referenced_dates(result.body, filters_on_text=filters)
-		# post-filters
-		articles = self.post_filter(articles)
-		# reporting
-		def filter_articles_by_ref_dates(articles, date):
-			results = []
-			for article in articles:
-				if article.ref_dates:
-					ref_dates = [r['date'] for r in article.ref_dates]
-					if date in ref_dates:
-						results.append(article)
-						continue
-			return results
+					if self.keep_results:
+						return articles
+					return None
+
+		since = None
+		if self.use_storage and self.incremental:
+			since = self.get_incremental_since()
+		results             = []
+		count               = 0
+		related_articles    = 0
+		urls_found          = []
+		tokenizer_load_time = Collector.TOKENIZER_LOAD_TIME
+		cache_hits          = brokenpromises.cache.get_extraction_cache().hits
+		brokenpromises.httpclient.get_http_client().reset_metrics()
+		for articles in self.collect(since=since):
+			count            += len(articles)
+			related_articles += len([a for a in articles if self.date in [r['date'] for r in a.ref_dates]])
+			urls_found       += [_.url for _ in articles]
+			if self.keep_results:
+				results += articles
 		self.set_report(
-			status         = "done",
-			count          = len(articles),
-			related_articles = len(filter_articles_by_ref_dates(articles, self.date)),
-			channels       = [c.__module__ for c in self.channels],
-			searched_date  = self.date,
-			urls_found     = [_.url for _ in articles],
-			forced_collect = self.force_collect
+			# "partial" if a channel failed, so that the next incremental collects don't rely on it
+			status                = self.channels_errors and "partial" or "done",
+			count                 = count,
+			related_articles      = related_articles,
+			channels              = [c.__module__ for c in self.channels],
+			searched_date         = self.date,
+			urls_found            = urls_found,
+			forced_collect        = self.force_collect,
+			searched_date_only    = self.searched_date_only,
+			incremental_since     = since and str(since),
+			# in seconds
+			channels_timings      = self.channels_timings,
+			channels_errors       = self.channels_errors,
+			# 0 when the tokenizer was already loaded by the process
+			tokenizer_load_time   = Collector.TOKENIZER_LOAD_TIME - tokenizer_load_time,
+			# articles whose references were taken from the extraction cache
+			extraction_cache_hits = brokenpromises.cache.get_extraction_cache().hits - cache_hits,
+			# by channel, the calls made to the APIs and the ones saved by grouping the date formats
+			api_calls             = dict((c.__module__.split(".")[-1], c.api_calls) for c in self.channels),
+			api_calls_saved       = dict((c.__module__.split(".")[-1], c.api_calls_saved) for c in self.channels),
+			# by channel, the calls made today to the APIs with a daily quota, by all the workers
+			api_quota_used        = self.get_quota_used(),
+			# requests, retries, errors and time by host
+			http_metrics          = brokenpromises.httpclient.get_http_client().get_metrics()
 		)
 		self.report.meta.update(self.report_extra)
-		# save articles and report if storage is enable
+		# save report if storage is enable
 		if self.use_storage:
-			articles = [article for article, code in self.storage.save_article(articles)]
 			self.storage.save_report(self.get_report())
+		if self.keep_results:
+			if since:
+				# the new articles merged with the ones of the previous collects
+				return self.storage.get_articles(self.date)
+			return results
+		return None
+
+	def get_quota_used(self):
+		""" by channel, the calls made today to the APIs with a daily quota, None if the ledger can't be read """
+		try:
+			ledger = brokenpromises.quota.get_quota_ledger()
+			return dict((c.__module__.split(".")[-1], ledger.get_used(c.__module__.split(".")[-1]))
+				for c in self.channels if c.DAILY_QUOTA)
+		except Exception as e:
+			# the collect is done, it is reported without the quotas
+			warning("quota ledger unavailable: %s" % (e))
+			return None
+
+	def get_incremental_since(self):
+		""" date from which the articles have to be fetched, None if this date was never collected """
+		previous_reports = self.storage.get_reports(
+			name          = "collector",
+			searched_date = self.date,
+			status        = "done",
+			channels      = [c.__module__ for c in self.channels])
+		if not previous_reports:
+			return None
+		# reports are sorted from the newest
+		return (previous_reports[0].date - datetime.timedelta(days=CollectArticles.INCREMENTAL_OVERLAP)).date()
+
+	def fetch_articles(self, since=None):
+		"""
+		Yields the articles from the channels, as they come. The channels are fetched
+		at the same time, each in its thread and until its deadline (see fetch_channel_articles).
+		A channel which fails or is late doesn't stop the others, it is reported in
+		channels_errors, and the time spent by each channel in channels_timings.
+		"""
+		self.channels_timings = {}
+		self.channels_errors  = {}
+		queue     = Queue.Queue(settings.COLLECT_BATCH_SIZE)
+		stop      = threading.Event()
+		started   = time.time()
+		deadlines = {}
+		for channel in self.channels:
+			name            = channel.__module__.split(".")[-1]
+			deadlines[name] = time.time() + (channel.DEADLINE or settings.CHANNEL_DEADLINE)
+			thread          = threading.Thread(target=self.fetch_channel_articles,
+				args=(channel, name, since, queue, stop, deadlines[name]))
+			# a channel stuck in a request after its deadline doesn't hold the job
+			thread.daemon   = True
+			thread.start()
+		try:
+			while deadlines:
+				try:
+					name, article = queue.get(timeout=max(0, min(deadlines.values()) - time.time()))
+				except Queue.Empty:
+					# the late channels are left behind
+					for name, deadline in deadlines.items():
+						if deadline <= time.time():
+							warning("channel %s exceeded its deadline" % (name))
+							self.channels_errors.setdefault(name, "deadline exceeded")
+							self.channels_timings[name] = round(time.time() - started, 3)
+							del deadlines[name]
+					continue
+				if name not in deadlines:
+					# from a late channel
+					continue
+				if article is None:
+					# the channel is done
+					del deadlines[name]
+					continue
+				yield article
+		finally:
+			stop.set()
+
+	def fetch_channel_articles(self, channel, name, since, queue, stop, deadline):
+		""" puts the (name, article) of the channel in the queue, then (name, None) when it's done """
+		def put(item):
+			while not stop.is_set():
+				try:
+					queue.put(item, timeout=.5)
+					return True
+				except Queue.Full:
+					pass
+			return False
+		start = time.time()
+		channel.api_calls       = 0
+		channel.api_calls_saved = 0
+		try:
+			# the channel stops its requests at its deadline, even if left behind by fetch_articles()
+			for article in channel.iter_articles(*self.date, since=since, deadline=deadline):
+				if not put((name, article)):
+					break
+				if time.time() > deadline:
+					warning("channel %s exceeded its deadline" % (name))
+					self.channels_errors.setdefault(name, "deadline exceeded")
+					break
+			if channel.budget_exhausted:
+				# some results were not read, the next incremental collects must not rely on this one
+				self.channels_errors.setdefault(name, "pages budget exhausted")
+		except brokenpromises.quota.QuotaExceeded as e:
+			# the articles already fetched are kept, the other channels go on
+			warning("channel %s stopped: %s" % (name, e))
+			self.channels_errors.setdefault(name, "quota exceeded")
+		except Exception as e:
+			error("channel %s failed: %s" % (name, e))
+			self.channels_errors.setdefault(name, "%s: %s" % (e.__class__.__name__, e))
+		finally:
+			self.channels_timings[name] = round(time.time() - start, 3)
+			put((name, None))
+
+	def collect(self, since=None):
+		"""
+		Yields the collected articles by batches of settings.COLLECT_BATCH_SIZE:
+		fetched, filtered, with their dates, and saved if storage is enable.
+		The channels are only asked for the next batch once the previous one is saved.
+		"""
+		pool = None
+		if settings.EXTRACTION_POOL_SIZE > 1:
+			pool = self.create_pool([c.__module__ for c in self.channels])
+		try:
+			for articles in brokenpromises.utils.batches(self.fetch_articles(since), settings.COLLECT_BATCH_SIZE):
+				# pre-filters
+				articles = self.pre_filter(articles)
+				# search dates in the body articles
+				self.retrieve_articles_referenced_dates(articles, pool=pool)
+				# post-filters
+				articles = self.post_filter(articles)
+				# save articles if storage is enable
+				if self.use_storage and articles:
+					articles = [article for article, code in self.storage.save_article(articles)]
+				yield articles
+		finally:
+			if pool:
+				pool.close()
+				pool.join()
+
+	def create_pool(self, channels):
+		""" pool of settings.EXTRACTION_POOL_SIZE processes for the extraction of the given channels """
+		# loaded before the fork, so the pool processes inherit them
+		Collector.get_tokenizer()
+		for channel in channels:
+			brokenpromises.channels.get_channel_filters(channel)
+		return multiprocessing.Pool(settings.EXTRACTION_POOL_SIZE)
+
+	def retrieve_articles_referenced_dates(self, articles, pool=None):
+		"""
+		Set the `ref_dates` of the given articles. The stored references are kept when their
+		`extraction_key` didn't change, the extractions already done for the same bodies
+		are taken from the cache (see brokenpromises.cache).
+		If settings.EXTRACTION_POOL_SIZE is more than 1, the other articles are sent
+		by batches to a pool of processes (the given one, or a pool created for this call).
+		"""
+		tasks = []
+		for article in articles:
+			if self.searched_date_only:
+				min_date = isinstance(article.pub_date, datetime.datetime) and article.pub_date or None
+				tasks.append((article.channel, article.body, self.date, min_date))
+			else:
+				tasks.append((article.channel, article.body, None, None))
+		cache      = brokenpromises.cache.get_extraction_cache()
+		keys       = [self.get_extraction_key(*task) for task in tasks]
+		references = [self.get_stored_references(article, key) for article, key in zip(articles, keys)]
+		references = [cache.get(key) if ref_dates is None else ref_dates for key, ref_dates in zip(keys, references)]
+		missing    = [i for i, ref_dates in enumerate(references) if ref_dates is None]
+		tasks      = [tasks[i] for i in missing]
+		own_pool = pool is None and settings.EXTRACTION_POOL_SIZE > 1 and len(tasks) > 1
+		if own_pool:
+			pool = self.create_pool(set(task[0] for task in tasks))
+		try:
+			if pool and len(tasks) > 1:
+				# results come back in the order of the tasks
+				extracted = pool.map(retrieve_article_referenced_dates, tasks, settings.EXTRACTION_BATCH_SIZE)
+			else:
+				extracted = map(retrieve_article_referenced_dates, tasks)
+		finally:
+			if own_pool:
+				pool.close()
+				pool.join()
+		for i, ref_dates in zip(missing, extracted):
+			cache.set(keys[i], ref_dates)
+			references[i] = ref_dates
+		for article, ref_dates, key in zip(articles, references, keys):
+			# copied, the cached references stay untouched
+			article.ref_dates      = [dict(_) for _ in ref_dates]
+			article.extraction_key = key
 		return articles
 
+	def get_stored_references(self, article, key):
+		""" the references kept from the storage (see Channel.reuse_stored_body) if they were extracted with this key """
+		if getattr(article, "extraction_key", None) != key:
+			return None
+		# the storage turns the date tuples into lists
+		return [dict(_, date=tuple(_["date"])) for _ in article.ref_dates]
+
+	def get_extraction_key(self, channel, body, target, min_date):
+		""" cache key of the references of a body: it changes with the filters, the date patterns or the splitter """
+		filters_version = brokenpromises.channels.get_filters_version(channel)
+		return brokenpromises.cache.get_extraction_key(body, channel, filters_version, dateparser.PATTERNS_VERSION,
+			settings.SENTENCE_SPLITTER, target, min_date)
+
 # -----------------------------------------------------------------------------
 #
 #    MrClean : delete articles older than 1 week
@@ -256,11 +542,13 @@ class CollectArticlesAndSendEmail(CollectArticles):
 	New data are now available on Broken Promises for the date of {date}
 	Check this out {link}
 	""".replace("\t", "")
-	def __init__(self, channels, year, month=None, day=None, report_extra={}, use_storage=False, force_collect=False, email=None):
+	def __init__(self, channels, year, month=None, day=None, report_extra={}, use_storage=False, force_collect=False,
+				 searched_date_only=False, keep_results=True, email=None):
 		self.email = email
 		super(CollectArticlesAndSendEmail, self).__init__(
 			channels=channels, year=year, month=month, day=day, report_extra={"email":email},
-			use_storage=use_storage, force_collect=force_collect)
+			use_storage=use_storage, force_collect=force_collect, searched_date_only=searched_date_only,
+			keep_results=keep_results, priority=brokenpromises.quota.HIGH)
 
 	def run(self, **kwargs):
 		# [ONLY IF STORAGE IS ENABLE] save the previous count of results.
@@ -296,7 +584,8 @@ class CollectToday(Collector):
 	def run(self, **kwargs):
 		today     = datetime.date.today()
 		date      = (today.year, today.month, today.day)
-		collector = CollectArticles(get_available_channels(), *date, use_storage=True, force_collect=True)
+		collector = CollectArticles(get_available_channels(), *date, use_storage=True, force_collect=True, keep_results=False,
+			incremental=True, priority=brokenpromises.quota.LOW)
 		worker.run(collector)
 
 class CollectNext7days(Collector):
@@ -306,7 +595,8 @@ class CollectNext7days(Collector):
 		for day in range(1, 7): # j+7
 			date = today + datetime.timedelta(days=day)
 			date = (date.year, date.month, date.day)
-			collector = CollectArticles(get_available_channels(), *date, use_storage=True)
+			collector = CollectArticles(get_available_channels(), *date, use_storage=True, keep_results=False,
+				incremental=True, priority=brokenpromises.quota.LOW)
 			worker.run(collector)
 
 class CollectNext2Months(Collector):
@@ -317,7 +607,8 @@ class CollectNext2Months(Collector):
 			date      = [None, None, None]
 			date[0]   = today.year + (today.month + month) / 12
 			date[1]   = (today.month + month - 1) % 12 + 1
-			collector = CollectArticles(get_available_channels(), *date, use_storage=True)
+			collector = CollectArticles(get_available_channels(), *date, use_storage=True, keep_results=False,
+				incremental=True, priority=brokenpromises.quota.LOW)
 			worker.run(collector)
 
 class CollectNext2Years(Collector):
@@ -326,7 +617,8 @@ class CollectNext2Years(Collector):
 		today = datetime.date.today()
 		for year in range(0,2):
 			date      = [today.year + year, None, None]
-			collector = CollectArticles(get_available_channels(), *date, use_storage=True)
+			collector = CollectArticles(get_available_channels(), *date, use_storage=True, keep_results=False,
+				incremental=True, priority=brokenpromises.quota.LOW)
 			worker.run(collector)
 
 # -----------------------------------------------------------------------------
@@ -435,6 +727,188 @@ class TestOperations(unittest.TestCase):
 			date_found.remove(ref['extracted_date'])
 		assert len(refs) == len(dates), "%s != %s\nToo much : %s" % (len(refs), len(dates), date_found)
 
+	def test_retrieve_articles_referenced_dates_in_pool(self):
+		from brokenpromises import Article
+		body      = "<p>The bridge will be ready in March 2014.</p><p>The 2 June 2015 was also quoted.</p>"
+		articles  = [Article("brokenpromises.channels.guardian", body=body.replace("2014", str(2014 + i))) for i in range(5)]
+		collector = CollectArticles(("brokenpromises.channels.guardian",), 2014)
+		serial    = [list(_.ref_dates) for _ in collector.retrieve_articles_referenced_dates(articles)]
+		pool_size = settings.EXTRACTION_POOL_SIZE
+		settings.EXTRACTION_POOL_SIZE = 2
+		try:
+			parallel = [list(_.ref_dates) for _ in collector.retrieve_articles_referenced_dates(articles)]
+		finally:
+			settings.EXTRACTION_POOL_SIZE = pool_size
+		assert parallel == serial, "%s != %s" % (parallel, serial)
+		assert [_[0]['date'] for _ in parallel] == [(2014 + i, 3, None) for i in range(5)], parallel
+
+	def test_collect_by_batches(self):
+		from brokenpromises import Article
+		body      = "<p>The bridge will be ready in March 2014, not in 2015.</p>"
+		pub_date  = datetime.datetime(2013, 1, 1)
+		fetched   = []
+		def iter_articles(year, month=None, day=None, since=None, deadline=None):
+			for i in range(10):
+				fetched.append(i)
+				yield Article("brokenpromises.channels.guardian", url="http://a/%d" % i, pub_date=pub_date,
+					body=i % 2 and body or "<p>Nothing</p>")
+		collector = CollectArticles(("brokenpromises.channels.guardian",), 2014, 3)
+		collector.channels[0].iter_articles = iter_articles
+		batch_size = settings.COLLECT_BATCH_SIZE
+		settings.COLLECT_BATCH_SIZE = 2
+		try:
+			batches = collector.collect()
+			assert [_.url for _ in batches.next()] == ["http://a/1"]
+			# the channel is only a batch ahead (the queue) and an article (waiting to be queued)
+			time.sleep(.1)
+			assert len(fetched) <= 5, fetched
+			assert [[_.url for _ in batch] for batch in batches] == [["http://a/3"], ["http://a/5"], ["http://a/7"], ["http://a/9"]]
+			articles = collector.run()
+		finally:
+			settings.COLLECT_BATCH_SIZE = batch_size
+		urls   = ["http://a/%d" % i for i in (1, 3, 5, 7, 9)]
+		assert [_.url for _ in articles] == urls
+		report = collector.get_report().meta
+		assert (report['count'], report['related_articles'], report['urls_found']) == (5, 5, urls), report
+		collector.keep_results = False
+		assert collector.run() is None
+		assert collector.get_report().meta['count'] == 5
+
+	def test_get_quota_used(self):
+		collector = CollectArticles(("brokenpromises.channels.guardian",), 2014)
+		ledger    = brokenpromises.quota.QUOTA_LEDGER
+		brokenpromises.quota.QUOTA_LEDGER = brokenpromises.quota.LocalQuotaLedger()
+		try:
+			brokenpromises.quota.QUOTA_LEDGER.spend("guardian", 10)
+			assert collector.get_quota_used() == {"guardian": 1}
+			class BrokenLedger(object):
+				def get_used(self, channel):
+					raise IOError("connection refused")
+			brokenpromises.quota.QUOTA_LEDGER = BrokenLedger()
+			assert collector.get_quota_used() is None
+		finally:
+			brokenpromises.quota.QUOTA_LEDGER = ledger
+
+	def test_fetch_articles_by_channel(self):
+		from brokenpromises          import Article
+		from brokenpromises.channels import Channel
+		class Fast(Channel):
+			def iter_articles(self, year, month=None, day=None, since=None, deadline=None):
+				for i in range(3):
+					yield Article(url="fast/%d" % i)
+		class Failing(Channel):
+			def iter_articles(self, year, month=None, day=None, since=None, deadline=None):
+				yield Article(url="failing/0")
+				raise ValueError("no response")
+		class Slow(Channel):
+			DEADLINE = .2
+			def iter_articles(self, year, month=None, day=None, since=None, deadline=None):
+				yield Article(url="slow/0")
+				time.sleep(1)
+				yield Article(url="slow/1")
+		class Truncated(Channel):
+			def iter_articles(self, year, month=None, day=None, since=None, deadline=None):
+				yield Article(url="truncated/0")
+				# the next pages are left unread
+				self.budget_exhausted = True
+		Fast.__module__, Failing.__module__, Slow.__module__ = "test.fast", "test.failing", "test.slow"
+		Truncated.__module__ = "test.truncated"
+		collector          = CollectArticles(("brokenpromises.channels.guardian",), 2014)
+		collector.channels = [Slow(), Failing(), Fast(), Truncated()]
+		start              = time.time()
+		urls               = sorted(_.url for _ in collector.fetch_articles())
+		# the channels run at the same time, the partial results are kept
+		assert time.time() - start < .8, time.time() - start
+		assert urls == ["failing/0", "fast/0", "fast/1", "fast/2", "slow/0", "truncated/0"], urls
+		assert collector.channels_errors == {"failing": "ValueError: no response", "slow": "deadline exceeded",
+		                                     "truncated": "pages budget exhausted"}, collector.channels_errors
+		assert sorted(collector.channels_timings.keys()) == ["failing", "fast", "slow", "truncated"], collector.channels_timings
+
+	def test_retrieve_articles_referenced_dates_cached(self):
+		from brokenpromises import Article
+		cache     = brokenpromises.cache.get_extraction_cache()
+		body      = "<p>The tunnel will open in May 2016.</p>"
+		collector = CollectArticles(("brokenpromises.channels.guardian",), 2016)
+		first     = collector.retrieve_articles_referenced_dates([Article("brokenpromises.channels.guardian", body=body)])[0]
+		first.ref_dates[0]['date'] = None
+		hits      = cache.hits
+		second    = collector.retrieve_articles_referenced_dates([Article("brokenpromises.channels.guardian", body=body)])[0]
+		assert cache.hits == hits + 1
+		assert [_['date'] for _ in second.ref_dates] == [(2016, 5, None)], second.ref_dates
+		# the key depends on the search options
+		collector.searched_date_only = True
+		collector.retrieve_articles_referenced_dates([Article("brokenpromises.channels.guardian", body=body)])
+		assert cache.hits == hits + 1
+
+	def test_retrieve_articles_referenced_dates_stored(self):
+		from brokenpromises import Article
+		body      = "<p>The tunnel will open in May 2016.</p>"
+		collector = CollectArticles(("brokenpromises.channels.guardian",), 2016)
+		article   = collector.retrieve_articles_referenced_dates([Article("brokenpromises.channels.guardian", body=body)])[0]
+		# as read back from the storage, with its dates as lists
+		stored    = Article("brokenpromises.channels.guardian", body=body, extraction_key=article.extraction_key,
+		                    ref_dates=[dict(_, date=list(_['date']), extract="stored") for _ in article.ref_dates])
+		stored    = collector.retrieve_articles_referenced_dates([stored])[0]
+		assert [(_['date'], _['extract']) for _ in stored.ref_dates] == [((2016, 5, None), "stored")], stored.ref_dates
+		# extracted again when the key changed
+		stored.extraction_key = "old"
+		stored    = collector.retrieve_articles_referenced_dates([stored])[0]
+		assert [_['extract'] for _ in stored.ref_dates] != ["stored"] and stored.extraction_key == article.extraction_key
+
+	def test_get_channel_filters(self):
+		filters = brokenpromises.channels.get_channel_filters("brokenpromises.channels.guardian")
+		assert filters("<p>In 2014.</p>") == CollectArticles(("brokenpromises.channels.guardian",), 2014).channels[0].apply_filters("<p>In 2014.</p>")
+		# resolved once
+		assert brokenpromises.channels.get_channel_filters("brokenpromises.channels.guardian") is filters
+		assert brokenpromises.channels.get_filters_version("brokenpromises.channels.guardian") == \
+		       brokenpromises.channels.perform_channels_import(("brokenpromises.channels.guardian",))[0].FILTERS_VERSION
+
+	def test_get_tokenizer(self):
+		tokenizer = Collector.get_tokenizer()
+		load_time = Collector.TOKENIZER_LOAD_TIME
+		assert Collector.get_sentence("First sentence. Then 2014 is here.", "2014") == "Then 2014 is here."
+		# loaded once per process
+		assert Collector.get_tokenizer()    is tokenizer
+		assert Collector.TOKENIZER_LOAD_TIME == load_time
+
+	def test_retrieve_referenced_dates_ranges(self):
+		refs = CollectArticles.retrieve_referenced_dates("Due on 3 March 2014, or in 2015. Not on 31 February 2014.")
+		assert [(_['start'], _['end']) for _ in refs] == [
+			(datetime.date(2014, 3, 3).toordinal(), datetime.date(2014, 3, 3).toordinal()),
+			(datetime.date(2015, 1, 1).toordinal(), datetime.date(2015, 12, 31).toordinal()),
+			(None, None)], refs
+
+	def test_retrieve_referenced_dates_extracts(self):
+		text = "In 2013, the first plan was announced. A second one followed. It was also for 2013."
+		refs = CollectArticles.retrieve_referenced_dates(text)
+		# the extract is the sentence where the date is, even when the same date is written twice
+		assert [_['extract'] for _ in refs] == ["In 2013, the first plan was announced.", "It was also for 2013."], refs
+
+	def test_retrieve_referenced_dates_with_target(self):
+		text = "Published on 3 January 2014, the plan is for 10 October 2014, then 2014 and October 2014. " \
+			"Last 10 October 2013 and 31 February 2014 do not count."
+		refs = CollectArticles.retrieve_referenced_dates(text, target=(2014, 10, 10))
+		assert [_['date'] for _ in refs] == [(2014, 10, 10)], refs
+		refs = CollectArticles.retrieve_referenced_dates(text, target=(2014, None, None))
+		# "2014" inside the full dates are not references to the year
+		assert [_['extracted_date'] for _ in refs] == ["2014"], refs
+		refs = CollectArticles.retrieve_referenced_dates(text, target=(2014, 10, None), min_date=datetime.date(2014, 1, 3))
+		assert [_['date'] for _ in refs] == [(2014, 10, None)], refs
+		refs = CollectArticles.retrieve_referenced_dates(text, target=(2014, 1, 3), min_date=datetime.date(2014, 1, 3))
+		assert refs == [], refs
+
+	def test_iter_dates(self):
+		import StringIO
+		text   = "Report due on 10 October 2013. Another one in November 2013 and 2014. " * 50
+		dates  = dateparser.find_dates(text)
+		chunks = [text[i:i + 7] for i in range(0, len(text), 7)]
+		assert len(dates) == 150, len(dates)
+		# dates straddling chunks are found once, with their position in the whole text
+		assert list(dateparser.iter_dates(iter(chunks)))                           == dates
+		assert list(dateparser.iter_dates(StringIO.StringIO(text), chunk_size=11)) == dates
+		for date_obj, date_row, (start, end) in dates:
+			assert text[start:end] == date_row, "%s != %s" % (text[start:end], date_row)
+
 if __name__ == "__main__":
 	# unittest.main()
 	suite = unittest.TestLoader().loadTestsFromTestCase(TestOperations)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# Encoding: utf-8
+# -----------------------------------------------------------------------------
+# Project : Broken Promises
+# -----------------------------------------------------------------------------
+# Author : Edouard Richard                                  <edou4rd@gmail.com>
+# -----------------------------------------------------------------------------
+# License : GNU General Public License
+# -----------------------------------------------------------------------------
+# Creation : 18-Oct-2026
+# Last mod : 18-Oct-2026
+# -----------------------------------------------------------------------------
+# This file is part of Broken Promises.
+#
+#     Broken Promises is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Broken Promises is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Broken Promises.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from   brokenpromises import settings
+import datetime
+import threading
+import reporter
+
+debug, trace, info, warning, error, fatal = reporter.bind(__name__)
+
+__doc__ = """
+
+	Daily quotas of calls to the APIs of the channels (see Channel.DAILY_QUOTA),
+	shared by every worker. Before each call, the channel spends a unit of the
+	quota of the day (UTC) in the ledger, which refuses it once the quota is
+	reached, and gets it back if the call didn't reach the API (ie: a response
+	from the cache of requests_cache, see settings). The scheduled collects (LOW priority) leave the last
+	settings.QUOTA_RESERVE of the quota to the searches asked by the users
+	(HIGH priority).
+
+	 - RedisQuotaLedger : the counters are kept in redis, for all the processes
+	 - LocalQuotaLedger : the counters are kept in memory, for one process (tests)
+
+"""
+
+HIGH = "high"
+LOW  = "low"
+
+class QuotaExceeded(Exception):
+	pass
+
+def get_limit(quota, priority):
+	""" the calls allowed in a day with this quota, for this priority """
+	if priority == LOW:
+		return quota - int(quota * settings.QUOTA_RESERVE)
+	return quota
+
+def get_day():
+	return datetime.datetime.utcnow().strftime("%Y-%m-%d")
+
+# -----------------------------------------------------------------------------
+#
+#    Ledgers
+#
+# -----------------------------------------------------------------------------
+class RedisQuotaLedger(object):
+	"""
+	A counter by channel and by day. The increment and the check are atomic
+	(INCR), a refused call gives its unit back (DECR).
+	"""
+
+	PREFIX = "brokenpromises:quota"
+	# in seconds, a counter is kept a bit longer than its day
+	EXPIRE = 2 * 24 * 60 * 60
+
+	def __init__(self, conn):
+		self.conn = conn
+
+	def get_key(self, channel, day=None):
+		return "%s:%s:%s" % (RedisQuotaLedger.PREFIX, channel, day or get_day())
+
+	def spend(self, channel, quota, priority=HIGH):
+		""" returns True if the call can be made, and counts it """
+		key  = self.get_key(channel)
+		pipe = self.conn.pipeline()
+		pipe.incr(key)
+		pipe.expire(key, RedisQuotaLedger.EXPIRE)
+		used = pipe.execute()[0]
+		if used > get_limit(quota, priority):
+			self.conn.decr(key)
+			return False
+		return True
+
+	def refund(self, channel):
+		""" gives back a unit spent for a call which wasn't made """
+		self.conn.decr(self.get_key(channel))
+
+	def get_used(self, channel):
+		return int(self.conn.get(self.get_key(channel)) or 0)
+
+class LocalQuotaLedger(object):
+
+	def __init__(self):
+		self.counters = {}
+		self.lock     = threading.Lock()
+
+	def spend(self, channel, quota, priority=HIGH):
+		""" returns True if the call can be made, and counts it """
+		key = (channel, get_day())
+		with self.lock:
+			if self.counters.get(key, 0) >= get_limit(quota, priority):
+				return False
+			self.counters[key] = self.counters.get(key, 0) + 1
+			return True
+
+	def refund(self, channel):
+		""" gives back a unit spent for a call which wasn't made """
+		key = (channel, get_day())
+		with self.lock:
+			if self.counters.get(key):
+				self.counters[key] -= 1
+
+	def get_used(self, channel):
+		return self.counters.get((channel, get_day()), 0)
+
+# -----------------------------------------------------------------------------
+#
+#    MODULE functions
+#
+# -----------------------------------------------------------------------------
+QUOTA_LEDGER = None # shared by the process, see get_quota_ledger()
+
+def get_quota_ledger():
+	global QUOTA_LEDGER
+	if QUOTA_LEDGER is None:
+		if settings.QUOTA_LEDGER == "redis":
+			import redis
+			QUOTA_LEDGER = RedisQuotaLedger(redis.from_url(settings.REDIS_URL))
+		else:
+			QUOTA_LEDGER = LocalQuotaLedger()
+	return QUOTA_LEDGER
+
+# -----------------------------------------------------------------------------
+#
+# TESTS
+#
+# -----------------------------------------------------------------------------
+import unittest
+
+class TestQuota(unittest.TestCase):
+	'''Test Class'''
+
+	def setUp(self):
+		self.reserve = settings.QUOTA_RESERVE
+		settings.QUOTA_RESERVE = .2
+
+	def tearDown(self):
+		settings.QUOTA_RESERVE = self.reserve
+
+	def test_spend(self):
+		ledger = LocalQuotaLedger()
+		assert all(ledger.spend("guardian", 10, LOW) for i in range(8))
+		# the reserve is left to the high priority
+		assert not ledger.spend("guardian", 10, LOW)
+		assert ledger.spend("guardian", 10, HIGH) and ledger.spend("guardian", 10, HIGH)
+		assert not ledger.spend("guardian", 10, HIGH)
+		assert ledger.get_used("guardian") == 10
+		ledger.refund("guardian")
+		assert ledger.get_used("guardian") == 9 and ledger.spend("guardian", 10, HIGH)
+		# a quota by channel
+		assert ledger.spend("nytimes", 10, LOW)
+
+	def test_spend_concurrently(self):
+		ledger  = LocalQuotaLedger()
+		results = []
+		def spend():
+			for i in range(50):
+				results.append(ledger.spend("guardian", 120))
+		threads = [threading.Thread(target=spend) for i in range(4)]
+		for thread in threads: thread.start()
+		for thread in threads: thread.join()
+		assert results.count(True) == 120 and ledger.get_used("guardian") == 120
+
+if __name__ == "__main__":
+	# unittest.main()
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestQuota)
+	unittest.TextTestRunner(verbosity=2).run(suite)
+
+# EOF
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# Encoding: utf-8
+# -----------------------------------------------------------------------------
+# Project : Broken Promises
+# -----------------------------------------------------------------------------
+# Author : Edouard Richard                                  <edou4rd@gmail.com>
+# -----------------------------------------------------------------------------
+# License : GNU General Public License
+# -----------------------------------------------------------------------------
+# Creation : 18-Oct-2026
+# Last mod : 18-Oct-2026
+# -----------------------------------------------------------------------------
+# This file is part of Broken Promises.
+#
+#     Broken Promises is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Broken Promises is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Broken Promises.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import re
+
+__doc__ = """
+
+	Sentence splitters. Each one has a `span_tokenize(text)` method which
+	returns the (start, end) of every sentence of the text.
+
+	 - punkt : the NLTK Punkt model for english (nltk_data/)
+	 - regex : RegexSplitter, rules for news prose, nothing to import or load
+
+"""
+
+# -----------------------------------------------------------------------------
+#
+#    Regex splitter
+#
+# -----------------------------------------------------------------------------
+class RegexSplitter(object):
+	"""
+	A sentence ends with `.`, `!` or `?` (and the quotes or brackets closed
+	after it) when the next word starts with a capital letter, a digit or an
+	opening quote, unless the word before the point is an abbreviation or an
+	initial (ie: "Mr. Smith", "J. K. Rowling", "the U.S. Senate").
+	A blank line always ends a sentence.
+	"""
+
+	ABBREVIATIONS = set((
+		"mr", "mrs", "ms", "messrs", "dr", "prof", "rev", "hon", "st", "jr", "sr",
+		"sen", "rep", "gov", "pres", "gen", "col", "maj", "capt", "lt", "sgt", "adm", "cmdr",
+		"co", "corp", "inc", "ltd", "bros", "dept", "univ", "assn",
+		"vs", "v", "approx", "est", "ft", "mt",
+		"jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+		"mon", "tue", "tues", "wed", "thu", "thurs", "fri", "sat", "sun",
+		"ala", "ariz", "calif", "colo", "conn", "fla", "ill", "ind", "kan", "mass", "mich",
+		"minn", "miss", "nev", "okla", "ore", "pa", "tenn", "tex", "va", "wash", "wis",
+	))
+	# only abbreviations before a number (ie: "No. 10" but "he said no.")
+	NUMBER_ABBREVIATIONS = set(("no", "nos", "vol", "fig", "art", "p", "pp"))
+
+	RE_BOUNDARY = re.compile(
+		u"(?:[.!?]+[\"')\\]”’]*[ \\t\\r\\n]+(?=[\"'(\\[“‘]*[A-Z0-9])|\\n[ \\t\\r]*\\n\\s*)",
+		re.UNICODE)
+
+	def span_tokenize(self, text):
+		spans = []
+		start = self._skip_spaces(text, 0)
+		for boundary in RegexSplitter.RE_BOUNDARY.finditer(text):
+			if boundary.start() <= start or not self._is_boundary(text, boundary):
+				continue
+			end = boundary.end()
+			while end > boundary.start() and text[end - 1].isspace():
+				end -= 1
+			spans.append((start, end))
+			start = boundary.end()
+		end = len(text.rstrip())
+		if end > start:
+			spans.append((start, end))
+		return spans
+
+	def _skip_spaces(self, text, position):
+		while position < len(text) and text[position].isspace():
+			position += 1
+		return position
+
+	def _is_boundary(self, text, boundary):
+		if text[boundary.start()] != ".":
+			# "!", "?" or a blank line
+			return True
+		# the word before the point
+		start = boundary.start()
+		while start > 0 and not text[start - 1].isspace():
+			start -= 1
+		word = text[start:boundary.start()].lstrip(u"\"'([“‘").lower()
+		if word in RegexSplitter.ABBREVIATIONS:
+			return False
+		if word in RegexSplitter.NUMBER_ABBREVIATIONS and text[boundary.end()].isdigit():
+			return False
+		# initials and acronyms: "J.", "U.S.", "a.m."
+		if len(word) == 1 and word.isalpha() or "." in word and word.replace(".", "").isalpha():
+			return False
+		return True
+
+# -----------------------------------------------------------------------------
+#
+#    Punkt
+#
+# -----------------------------------------------------------------------------
+PUNKT_PATH = os.path.join(os.path.dirname(__file__), "nltk_data/tokenizers/punkt/english.pickle")
+
+def load_punkt():
+	# nltk is imported here, it is long to import and the regex splitter doesn't need it
+	import nltk
+	return nltk.data.load("file:%s" % (PUNKT_PATH))
+
+# -----------------------------------------------------------------------------
+#
+#    MODULE functions
+#
+# -----------------------------------------------------------------------------
+SPLITTERS = {
+	"punkt" : load_punkt,
+	"regex" : RegexSplitter,
+}
+
+def load(name):
+	assert name in SPLITTERS, "sentence splitter %s unknown." % (name)
+	return SPLITTERS[name]()
+
+# -----------------------------------------------------------------------------
+#
+# TESTS
+#
+# -----------------------------------------------------------------------------
+import unittest
+
+class TestSentences(unittest.TestCase):
+	'''Test Class'''
+
+	def setUp(self):
+		self.splitter = RegexSplitter()
+
+	def split(self, text):
+		return [text[start:end] for start, end in self.splitter.span_tokenize(text)]
+
+	def test_split(self):
+		text = "  The plan was announced on Monday. It should be ready in 2014!  Will it? "
+		assert self.split(text) == ["The plan was announced on Monday.", "It should be ready in 2014!", "Will it?"], self.split(text)
+
+	def test_abbreviations_and_initials(self):
+		text = "Mr. Smith met Dr. J. K. Rowling in the U.S. Senate on Jan. 3. The meeting lasted 2.5 hours in room No. 10. He said no. Then he left."
+		assert self.split(text) == [
+			"Mr. Smith met Dr. J. K. Rowling in the U.S. Senate on Jan. 3.",
+			"The meeting lasted 2.5 hours in room No. 10.",
+			"He said no.",
+			"Then he left."], self.split(text)
+
+	def test_quotes(self):
+		text = u"\"We will finish by 2015.\" The minister added: “Not before.” (Later, he said no.) Then he left."
+		assert self.split(text) == [
+			u"\"We will finish by 2015.\"",
+			u"The minister added: “Not before.”",
+			u"(Later, he said no.)",
+			u"Then he left."], self.split(text)
+
+	def test_blank_lines(self):
+		text = "A headline without point\n\nThe first paragraph. the lowercase goes on"
+		assert self.split(text) == ["A headline without point", "The first paragraph. the lowercase goes on"], self.split(text)
+
+	def test_load(self):
+		assert isinstance(load("regex"), RegexSplitter)
+		self.assertRaises(AssertionError, load, "unknown")
+
+if __name__ == "__main__":
+	# unittest.main()
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestSentences)
+	unittest.TextTestRunner(verbosity=2).run(suite)
+
+# EOF
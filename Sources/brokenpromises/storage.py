@@ -28,6 +28,8 @@
 from pymongo import MongoClient
 from urlparse import urlparse
 from brokenpromises import settings, Article, Report
+import brokenpromises.utils
+import datetime
 
 CODE_ERROR  = 0
 CODE_INSERT = 1
@@ -37,6 +39,7 @@ class Storage(object):
 
 	COLLECTION_ARTICLES = "articles"
 	COLLECTION_REPORTS  = "reports"
+	COLLECTION_FORMATS  = "formats_stats"
 
 	def __init__(self, uri=None):
 		self.mongo_uri = uri or settings.MONGODB_URI
@@ -75,19 +78,53 @@ class Storage(object):
 			return (Article(**article_merged), CODE_UPDATE)
 		return (article, CODE_ERROR)
 
-	def _get_articles(self, date=None, limit=0, skip=0):
+	def get_articles_by_url(self, urls):
+		""" returns the stored articles with one of the given urls, by url """
+		articles_collection = self.get_collection(Storage.COLLECTION_ARTICLES)
+		articles            = articles_collection.find({"url": {"$in": list(urls)}})
+		return dict((article['url'], Article(**article)) for article in articles)
+
+	def _get_articles(self, date=None, limit=0, skip=0, within=False):
+		"""
+		articles with a reference to the given date, or with
+		`within`, to any date falling in it (ie: the days of a month).
+		"""
 		articles_collection = self.get_collection(Storage.COLLECTION_ARTICLES)
 		if not date or date == (None, None, None):
 			articles = articles_collection.find(skip=skip, limit=limit)
+		elif within:
+			start, end = brokenpromises.utils.get_date_range(*date)
+			search     = {"ref_dates": {"$elemMatch": {"start": {"$gte": start}, "end": {"$lte": end}}}}
+			articles   = articles_collection.find(search, skip=skip, limit=limit)
 		else:
 			articles = articles_collection.find({"ref_dates.date": date}, skip=skip, limit=limit)
 		return articles
 
-	def get_articles(self, date=None, limit=0, skip=0):
-		return [Article(**article) for article in self._get_articles(date, limit=limit, skip=skip)]
+	def get_articles(self, date=None, limit=0, skip=0, within=False):
+		return [Article(**article) for article in self._get_articles(date, limit=limit, skip=skip, within=within)]
 
-	def count_articles(self, date=None, limit=0, skip=0):
-		return self._get_articles(date, limit=limit, skip=skip).count()
+	def count_articles(self, date=None, limit=0, skip=0, within=False):
+		return self._get_articles(date, limit=limit, skip=skip, within=within).count()
+
+	def ensure_indexes(self):
+		""" indexes used by the range queries on the references and the lookups by url """
+		articles_collection = self.get_collection(Storage.COLLECTION_ARTICLES)
+		articles_collection.ensure_index([("ref_dates.start", 1), ("ref_dates.end", 1)])
+		articles_collection.ensure_index("url")
+
+	def backfill_date_ranges(self):
+		"""
+		set the `start` and `end` of the references saved without them.
+		Returns the number of updated articles.
+		"""
+		articles_collection = self.get_collection(Storage.COLLECTION_ARTICLES)
+		updated = 0
+		for article in articles_collection.find({"ref_dates": {"$elemMatch": {"start": {"$exists": False}}}}, fields=["ref_dates"]):
+			for reference in article['ref_dates']:
+				reference.update(brokenpromises.utils.get_reference_range(reference['date']))
+			articles_collection.update({'_id': article['_id']}, {"$set": {"ref_dates": article['ref_dates']}})
+			updated += 1
+		return updated
 
 	def _remove_article(self, article):
 		articles_collection = self.get_collection(Storage.COLLECTION_ARTICLES)
@@ -109,7 +146,7 @@ class Storage(object):
 		return CODE_INSERT
 
 	def get_reports(self, name=None, searched_date=None, status=None, channels=None):
-		# TODO: handle channels
+		""" reports sorted from the newest. With `channels`, only the reports which cover all of them """
 		report_collection = self.get_collection(Storage.COLLECTION_REPORTS)
 		search = {}
 		if searched_date and searched_date != (None, None, None):
@@ -118,8 +155,35 @@ class Storage(object):
 			search["name"] = name
 		if status:
 			search["meta.status"] = status
+		if channels:
+			search["meta.channels"] = {"$all": list(channels)}
 		return [Report(**report) for report in report_collection.find(search).sort('date', -1)]
 
+	# -----------------------------------------------------------------------------
+	#
+	#    Date formats statistics
+	#
+	# -----------------------------------------------------------------------------
+	def get_formats_stats(self, channel):
+		""" the statistics of the date formats searched in the channel, by format """
+		formats_collection = self.get_collection(Storage.COLLECTION_FORMATS)
+		return dict((stats['format'], stats) for stats in formats_collection.find({"channel": channel}))
+
+	def update_formats_stats(self, channel, hits):
+		"""
+		adds a trial to each format of `hits` ({format: number of new articles}), and its hits.
+		`rate` is the average of the hits by trial over the last settings.FORMATS_WINDOW trials.
+		"""
+		formats_collection = self.get_collection(Storage.COLLECTION_FORMATS)
+		for format, count in hits.items():
+			stats  = formats_collection.find_one({"channel": channel, "format": format}) or {}
+			trials = stats.get("trials", 0)
+			rate   = stats.get("rate", float(stats.get("hits", 0)) / trials if trials else 0.)
+			# a plain average over the first trials, then a moving one
+			rate  += (count - rate) / min(trials + 1, settings.FORMATS_WINDOW)
+			formats_collection.update({"channel": channel, "format": format},
+				{"$inc": {"trials": 1, "hits": count}, "$set": {"rate": rate, "updated": datetime.datetime.now()}}, upsert=True)
+
 # -----------------------------------------------------------------------------
 #
 #    TESTS
@@ -179,6 +243,43 @@ class TestStorage(unittest.TestCase):
 		assert type(res[0]) is Article, type(res)
 		assert len(res) == 1
 
+	def test_get_articles_by_url(self):
+		self.storage.save_article([Article(url="test1", body="body1"), Article(url="test2")])
+		res = self.storage.get_articles_by_url(["test1", "test3"])
+		assert res.keys() == ["test1"], res
+		assert res["test1"].body == "body1"
+
+	def test_get_articles_within(self):
+		a = Article(url="test1", ref_dates=[{"date": (2014, 3, 14)}])
+		b = Article(url="test2", ref_dates=[{"date": (2014, 3, None)}, {"date": (2015, None, None)}])
+		c = Article(url="test3", ref_dates=[{"date": (2014, None, None)}])
+		self.storage.save_article([a, b, c])
+		assert self.storage.backfill_date_ranges() == 3
+		assert self.storage.backfill_date_ranges() == 0
+		self.storage.ensure_indexes()
+		assert sorted(_.url for _ in self.storage.get_articles((2014, 3, None), within=True)) == ["test1", "test2"]
+		assert [_.url for _ in self.storage.get_articles((2014, 3, None))]                    == ["test2"]
+		assert self.storage.count_articles((2014, None, None), within=True)                    == 3
+		assert self.storage.count_articles((2014, 3, 14), within=True)                         == 1
+
+	def test_formats_stats(self):
+		self.storage.update_formats_stats("guardian", {"{year}": 2, "{month} {year}": 0})
+		self.storage.update_formats_stats("guardian", {"{year}": 1})
+		stats = self.storage.get_formats_stats("guardian")
+		assert (stats["{year}"]["trials"], stats["{year}"]["hits"]) == (2, 3), stats
+		assert (stats["{month} {year}"]["trials"], stats["{month} {year}"]["hits"]) == (1, 0), stats
+		assert stats["{year}"]["rate"] == 1.5 and stats["{month} {year}"]["rate"] == 0, stats
+		assert self.storage.get_formats_stats("nytimes") == {}
+		# the old hits weigh less than the recent ones
+		window = settings.FORMATS_WINDOW
+		settings.FORMATS_WINDOW = 2
+		try:
+			for hits in (4, 0, 0):
+				self.storage.update_formats_stats("nytimes", {"{year}": hits})
+			assert self.storage.get_formats_stats("nytimes")["{year}"]["rate"] == 1, self.storage.get_formats_stats("nytimes")
+		finally:
+			settings.FORMATS_WINDOW = window
+
 	def test_save_report(self):
 		from brokenpromises import Report
 		r   = Report()
@@ -197,6 +298,14 @@ class TestStorage(unittest.TestCase):
 		assert len(res_ko) == 0, len(res_ko)
 		assert type(res_ok[0]) is Report
 
+	def test_get_reports_by_channels(self):
+		from brokenpromises import Report
+		r   = Report()
+		r.meta['channels'] = ["brokenpromises.channels.guardian", "brokenpromises.channels.nytimes"]
+		self.storage.save_report(r)
+		assert len(self.storage.get_reports(channels=["brokenpromises.channels.guardian"])) == 1
+		assert len(self.storage.get_reports(channels=["brokenpromises.channels.guardian", "brokenpromises.channels.other"])) == 0
+
 if __name__ == "__main__":
 	# unittest.main()
 	suite = unittest.TestLoader().loadTestsFromTestCase(TestStorage)
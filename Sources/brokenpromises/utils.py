@@ -28,8 +28,36 @@
 import datetime
 import calendar
 
-def get_all_date_formats(year, month=None, day=None):
-	formats = []
+# phrasings of a date searched in the channels, by precision
+DAY_FORMATS = (
+	"{day} {month} {year}",
+	"{day}th of {month}, {year}",
+	"{day}th in {month}, {year}",
+	"{day}th by {month}, {year}",
+	"{day}th of {month} {year}",
+	"{day}th in {month} {year}",
+	"{day}th by {month} {year}",
+	"{day}th {month} {year}",
+	"{day} of {month}, {year}",
+	"{day} in {month}, {year}",
+	"{day} by {month}, {year}",
+	"{day} of {month} {year}",
+	"{day} in {month} {year}",
+	"{day} by {month} {year}",
+	"{day} {month}, {year}",
+	"{iso}",
+	"{iso_slashes}",
+)
+MONTH_FORMATS = (
+	"{month} {year}",
+	"{month}, {year}",
+)
+YEAR_FORMATS = (
+	"{year}",
+)
+
+def iter_date_formats(year, month=None, day=None):
+	""" yields the (format, phrasing) of the date for each format, ie: ("{month} {year}", "October 2013") """
 	if day is not None:
 		assert month is not None
 		day = int(day)
@@ -38,29 +66,17 @@ def get_all_date_formats(year, month=None, day=None):
 	year = int(year)
 	date = datetime.date(year, month or 1, day or 1)
 	if day:
-		formats.append("%s %s %s"       % (day, date.strftime("%B"), year))
-		formats.append("%sth of %s, %s" % (day, date.strftime("%B"), year))
-		formats.append("%sth in %s, %s" % (day, date.strftime("%B"), year))
-		formats.append("%sth by %s, %s" % (day, date.strftime("%B"), year))
-		formats.append("%sth of %s %s"  % (day, date.strftime("%B"), year))
-		formats.append("%sth in %s %s"  % (day, date.strftime("%B"), year))
-		formats.append("%sth by %s %s"  % (day, date.strftime("%B"), year))
-		formats.append("%sth %s %s"     % (day, date.strftime("%B"), year))
-		formats.append("%s of %s, %s"   % (day, date.strftime("%B"), year))
-		formats.append("%s in %s, %s"   % (day, date.strftime("%B"), year))
-		formats.append("%s by %s, %s"   % (day, date.strftime("%B"), year))
-		formats.append("%s of %s %s"    % (day, date.strftime("%B"), year))
-		formats.append("%s in %s %s"    % (day, date.strftime("%B"), year))
-		formats.append("%s by %s %s"    % (day, date.strftime("%B"), year))
-		formats.append("%s %s, %s"      % (day, date.strftime("%B"), year))
-		formats.append(date.isoformat())
-		formats.append(date.isoformat().replace("-", "/"))
+		formats = DAY_FORMATS
 	elif month:
-		formats.append("%s %s"  % (date.strftime("%B"), year))
-		formats.append("%s, %s" % (date.strftime("%B"), year))
+		formats = MONTH_FORMATS
 	else:
-		formats.append("%s" % year)
-	return formats
+		formats = YEAR_FORMATS
+	for format in formats:
+		yield format, format.format(day=day, month=date.strftime("%B"), year=year,
+			iso=date.isoformat(), iso_slashes=date.isoformat().replace("-", "/"))
+
+def get_all_date_formats(year, month=None, day=None):
+	return [phrasing for format, phrasing in iter_date_formats(year, month, day)]
 
 def get_the_date_before(year, month=None, day=None):
 	if not month:
@@ -70,6 +86,41 @@ def get_the_date_before(year, month=None, day=None):
 	date = datetime.date(year, month or 1, day or 1)
 	return date
 
+def get_date_range(year, month=None, day=None):
+	"""
+	returns the ordinals of the first and the last days of the date,
+	ie: (2014, 3, None) is from 2014-03-01 to 2014-03-31.
+	Raises a ValueError if it's not a real date.
+	"""
+	first = datetime.date(year, month or 1, day or 1)
+	if day:
+		last = first
+	elif month:
+		last = datetime.date(year, month, calendar.monthrange(year, month)[1])
+	else:
+		last = datetime.date(year, 12, 31)
+	return (first.toordinal(), last.toordinal())
+
+def get_reference_range(date):
+	""" `start` and `end` of a reference, the ordinals of the first and last days of its date """
+	try:
+		start, end = get_date_range(*date)
+	except ValueError:
+		# not a real date (ie: 31 February 2013)
+		start, end = None, None
+	return {"start": start, "end": end}
+
+def batches(iterable, size):
+	""" yields lists of `size` items of the iterable (the last one can be shorter) """
+	batch = []
+	for item in iterable:
+		batch.append(item)
+		if len(batch) >= size:
+			yield batch
+			batch = []
+	if batch:
+		yield batch
+
 def date_to_string(year, month=None, day=None):
 	date = "%s" % (year)
 	if month:
@@ -101,6 +152,21 @@ class TestUtils(unittest.TestCase):
 		formats.sort()
 		assert(formats == ['10 October 2013', '10 October, 2013', '10 by October 2013', '10 by October, 2013', '10 in October 2013', '10 in October, 2013', '10 of October 2013', '10 of October, 2013', '10th October 2013', '10th by October 2013', '10th by October, 2013', '10th in October 2013', '10th in October, 2013', '10th of October 2013', '10th of October, 2013', '2013-10-10', '2013/10/10']), formats
 
+	def test_iter_date_formats(self):
+		formats = list(iter_date_formats(2013, 10))
+		assert formats == [("{month} {year}", "October 2013"), ("{month}, {year}", "October, 2013")], formats
+		assert len(list(iter_date_formats(2013, 10, 10))) == len(DAY_FORMATS)
+
+	def test_get_date_range(self):
+		assert get_date_range(2014, 3, 14) == (datetime.date(2014, 3, 14).toordinal(), datetime.date(2014, 3, 14).toordinal())
+		assert get_date_range(2014, 2)     == (datetime.date(2014, 2, 1).toordinal() , datetime.date(2014, 2, 28).toordinal())
+		assert get_date_range(2014)        == (datetime.date(2014, 1, 1).toordinal() , datetime.date(2014, 12, 31).toordinal())
+		self.assertRaises(ValueError, get_date_range, 2014, 2, 31)
+
+	def test_batches(self):
+		assert list(batches(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
+		assert list(batches([], 2))             == []
+
 	def test_date_to_string(self):
 		assert date_to_string(2013)       == "2013"
 		assert date_to_string(2013, 2)    == "Feb 2013"
@@ -27,6 +27,9 @@
 
 # Inspired from https://code.google.com/p/nltk/source/browse/trunk/nltk_contrib/nltk_contrib/timex.py
 import re
+import bisect
+import datetime
+import itertools
 
 RE_NUMBERS      = "(^a(?=\s)|one|two|three|four|five|six|seven|eight|nine|ten|\
 eleven|twelve|thirteen|fourteen|fifteen|sixteen|seventeen|\
@@ -122,69 +125,225 @@ def _parse_month(month):
 def get_date_obj(mx_date):
     return (mx_date.year, mx_date.month, mx_date.day)
 
-def find_dates(text, base_date=None):
-    """
-
-    If base_date is given, returns the parsed dates
-
-    """
-    dates_found = []
-
-    def already_full_parsed(this_row, this_pos):
-        for date_obj, date_row, date_pos in dates_found:
-            if this_pos[0]      >= date_pos[0] \
-                and this_pos[1] <= date_pos[1] \
-                and this_row    in date_row:
-                return True
-        return False
-
-    def find_regex(regex, infos):
-        for date in regex.finditer(text):
-            date_row = date.group()
-            if already_full_parsed(date_row, date.span()):
-                continue
-            date_obj = {
-                "day"   : None,
-                "month" : None,
-                "year"  : None
-            }
-            for key, parser in infos:
-                date_obj[key] = parser(date.group(key))
-            dates_found.append(
-                (
-                    (date_obj['year'], date_obj['month'], date_obj['day']),
-                    date_row, date.span()
-                )
-            )
-
-    find_regex(RE_FULL_DATE1, (
+# Every date form, from the most to the least specific, with the parsers to
+# apply on its named groups. At a given position, the first form which
+# matches wins.
+DATE_FORMS = (
+    ("full_date1", RE_FULL_DATE1, (
         ("day"   , int),
         ("month" , _parse_month),
         ("year"  , int)
-    ))
-    find_regex(RE_FULL_DATE2, (
+    )),
+    ("full_date2", RE_FULL_DATE2, (
         ("day"   , int),
         ("month" , _parse_month),
         ("year"  , int)
-    ))
-    find_regex(RE_ISO1, (
+    )),
+    ("iso1", RE_ISO1, (
         ("day"   , int),
         ("month" , int),
         ("year"  , int)
-    ))
-    find_regex(RE_ISO2, (
+    )),
+    ("iso2", RE_ISO2, (
         ("month" , int),
         ("year"  , int),
         ("day"   , int)
-    ))
-    find_regex(RE_FULL_MONTH, (
+    )),
+    ("full_month", RE_FULL_MONTH, (
         ("month" , _parse_month),
         ("year"  , int)
-    ))
-    find_regex(RE_YEAR, (
+    )),
+    ("year", RE_YEAR, (
         ("year"  , int),
-    ))
+    )),
+)
+
+def _combine_forms(forms):
+    """
+    Merge the date forms into a single pattern, scanned once. Each form is
+    wrapped in a group named after it and its own groups are prefixed by
+    this name (ie: `full_date1_day`). The whole alternation is a lookahead
+    so that a form starting inside a previous match is still a candidate,
+    like it was when each form had its own pass.
+    """
+    patterns = []
+    for name, regex, infos in forms:
+        pattern = re.sub(r"\(\?P<(\w+)>", r"(?P<%s_\1>" % (name), regex.pattern)
+        patterns.append("(?P<%s>%s)" % (name, pattern))
+    return re.compile("(?=%s)" % ("|".join(patterns)), re.IGNORECASE)
+
+RE_DATES      = _combine_forms(DATE_FORMS)
+PARSERS       = dict((name, infos) for name, regex, infos in DATE_FORMS)
+# to increment when a change of the forms or of their parsing changes the
+# dates found, or when the references get new fields (2: start and end days),
+# it invalidates the extractions cached by the collectors.
+PATTERNS_VERSION = "2"
+
+# Every date form contains a year. Its digits are used to locate the few
+# places where a date can be, the combined pattern being only tried in the
+# DATE_PREFIX_LENGTH characters before them (ie: "31th by september, ").
+# DATE_SUFFIX_LENGTH is the longest match starting with a year (2013-10-31)
+# and DATE_CONTEXT_LENGTH the longest text read by a lookbehind (&pound;).
+RE_YEAR_DIGITS      = re.compile("(?:19|20)\d\d")
+DATE_PREFIX_LENGTH  = 24
+DATE_SUFFIX_LENGTH  = 10
+DATE_CONTEXT_LENGTH = 8
+
+def _iter_candidates(text, position=0, limit=None, anchor=RE_YEAR_DIGITS):
+    """ yields the matches of RE_DATES starting between `position` and `limit`, from left to right """
+    if limit is None:
+        limit = len(text)
+    for year in anchor.finditer(text, position):
+        if year.start() - DATE_PREFIX_LENGTH >= limit:
+            break
+        position = max(position, year.start() - DATE_PREFIX_LENGTH)
+        last     = min(year.start(), limit - 1)
+        for date in RE_DATES.finditer(text, position, year.start() + DATE_SUFFIX_LENGTH):
+            if date.start() > last:
+                break
+            yield date
+        position = last + 1
+
+def _parse_candidate(date):
+    form     = date.lastgroup
+    date_obj = {
+        "day"   : None,
+        "month" : None,
+        "year"  : None
+    }
+    for key, parser in PARSERS[form]:
+        date_obj[key] = parser(date.group("%s_%s" % (form, key)))
+    return (date_obj['year'], date_obj['month'], date_obj['day'])
+
+def _target_forms(target):
+    """ names of the forms which have the same precision than `target` (year, month, day) """
+    keys = set(key for key, value in zip(("year", "month", "day"), target) if value)
+    return set(name for name, regex, infos in DATE_FORMS if set(key for key, parser in infos) == keys)
+
+def _is_after(date_obj, min_date):
+    try:
+        return datetime.date(date_obj[0], date_obj[1] or 1, date_obj[2] or 1) > min_date
+    except ValueError:
+        # not a real date (ie: 31 February 2013)
+        return False
+
+class SpanIndex(object):
+    """
+    Spans of the dates already found, to know if a new match is a part of
+    a longer date (ie: "2013" in "10 October 2013").
+    A span covered by another one is never kept, so the spans are sorted by
+    their start as well as by their end, and the only one which can cover a
+    new span is the last one starting before it.
+    """
 
-    return dates_found
+    def __init__(self):
+        self.starts = []
+        self.ends   = []
+
+    def covers(self, span):
+        index = bisect.bisect_right(self.starts, span[0]) - 1
+        return index >= 0 and self.ends[index] >= span[1]
+
+    def add(self, span):
+        start = bisect.bisect_left(self.starts, span[0])
+        # replace the spans which are covered by the new one
+        end   = start
+        while end < len(self.ends) and self.ends[end] <= span[1]:
+            end += 1
+        self.starts[start:end] = [span[0]]
+        self.ends[start:end]   = [span[1]]
+
+    def discard_before(self, position):
+        """ forget the spans which end before `position` """
+        index = bisect.bisect_right(self.ends, position)
+        del self.starts[:index]
+        del self.ends[:index]
+
+CHUNK_SIZE = 64 * 1024
+
+def _iter_chunks(source, chunk_size=CHUNK_SIZE):
+    if isinstance(source, basestring):
+        yield source
+    elif hasattr(source, "read"):
+        for chunk in iter(lambda: source.read(chunk_size), ""):
+            yield chunk
+    else:
+        for chunk in source:
+            yield chunk
+
+def iter_dates(source, chunk_size=CHUNK_SIZE, target=None, min_date=None):
+    """
+    Yields the (date_obj, date_row, span) found in `source` as soon as they
+    are found, in the order where they appear.
+    `source` can be a string, an iterator of strings or a file-like object
+    (read by `chunk_size`). Spans are offsets in the whole source and a date
+    can straddle two chunks. Only the end of the text which can still be a
+    part of a date is kept in memory.
+
+    If `target` (year, month, day) is given, only the dates equal to it are
+    yielded. Only the places where its year is written are searched and the
+    forms with another precision are skipped before being parsed.
+    If `min_date` is given, only the dates after it are yielded.
+    """
+    anchor = RE_YEAR_DIGITS
+    forms  = None
+    if target:
+        target = tuple(target)
+        # a date covering another one has the same year, so the dates with
+        # the target's year are still compared to the longer dates around.
+        anchor = re.compile(str(target[0]))
+        forms  = _target_forms(target)
+    if isinstance(min_date, datetime.datetime):
+        min_date = min_date.date()
+    # candidates come from left to right and the most specific form wins at
+    # a given position, so a date is always indexed before its parts.
+    spans    = SpanIndex()
+    text     = ""
+    offset   = 0 # position of `text` in the source
+    position = 0 # where the next candidate can start in `text`
+    # None stands for the end of the source, where all the text is complete
+    for chunk in itertools.chain(_iter_chunks(source, chunk_size), (None,)):
+        if chunk is None:
+            limit = len(text)
+        else:
+            text += chunk
+            # a date starting after `limit` could go on in the next chunk
+            limit = len(text) - DATE_PREFIX_LENGTH - DATE_SUFFIX_LENGTH
+            if limit <= position:
+                continue
+        for date in _iter_candidates(text, position, limit, anchor):
+            start, end = date.span(date.lastgroup)
+            date_row   = date.group(date.lastgroup)
+            date_pos   = (offset + start, offset + end)
+            if spans.covers(date_pos):
+                continue
+            spans.add(date_pos)
+            if forms is not None and date.lastgroup not in forms:
+                continue
+            date_obj = _parse_candidate(date)
+            if target and date_obj != target:
+                continue
+            if min_date and not _is_after(date_obj, min_date):
+                continue
+            yield (date_obj, date_row, date_pos)
+        position = limit
+        # keep only what the lookbehinds need before the next candidates
+        cut = position - DATE_CONTEXT_LENGTH
+        if cut > 0:
+            text      = text[cut:]
+            offset   += cut
+            position -= cut
+            spans.discard_before(offset + position)
+
+def find_dates(text, base_date=None, target=None, min_date=None):
+    """
+
+    If base_date is given, returns the parsed dates
+
+    Returns a list of (date_obj, date_row, span) in the order where they
+    appear in the text. See `iter_dates` for `target` and `min_date`.
+
+    """
+    return list(iter_dates(text, target=target, min_date=min_date))
 
 # EOF
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# Encoding: utf-8
+# -----------------------------------------------------------------------------
+# Project : Broken Promises
+# -----------------------------------------------------------------------------
+# Author : Edouard Richard                                  <edou4rd@gmail.com>
+# -----------------------------------------------------------------------------
+# License : GNU General Public License
+# -----------------------------------------------------------------------------
+# Creation : 18-Oct-2026
+# Last mod : 18-Oct-2026
+# -----------------------------------------------------------------------------
+# This file is part of Broken Promises.
+#
+#     Broken Promises is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Broken Promises is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Broken Promises.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from   brokenpromises.channels.guardian import TheGuardian
+from   brokenpromises.channels.nytimes  import NewYorkTimes
+from   brokenpromises.channels          import get_strainer
+from   bs4 import BeautifulSoup
+import argparse
+import codecs
+import os
+import resource
+import time
+
+__doc__ = """
+
+	Compare the body extraction of the channels, which only parses the
+	elements matching their BODY_SELECTORS, to the parsing of the whole page
+	(as it was done before): parse time, nodes built and memory, on the given
+	saved pages (named guardian-*.html or nytimes-*.html).
+	Without pages, it runs on the synthetic ones of Tests/fixtures: their text
+	is generated, they only check that both parsings give the same body and the
+	numbers they give are not the ones of real pages.
+
+"""
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+CHANNELS = {
+	"guardian" : TheGuardian,
+	"nytimes"  : NewYorkTimes,
+}
+
+def full_tree(channel, html):
+	""" parses the whole page then looks for the body (as before) """
+	soup = BeautifulSoup(html, "lxml")
+	for selector in channel.BODY_SELECTORS:
+		elements = soup.find_all(**selector)
+		if elements:
+			return soup, elements
+	return soup, []
+
+def partial_tree(channel, html):
+	""" parses only the body, as Channel.extract_body does """
+	for selector in channel.BODY_SELECTORS:
+		soup     = BeautifulSoup(html, "lxml", parse_only=get_strainer(selector))
+		elements = soup.find_all(recursive=False)
+		if elements:
+			return soup, elements
+	return soup, []
+
+def body(tree):
+	return u"".join(unicode(element) for element in tree[1])
+
+def parse_time(parse, channel, html, repeat):
+	start = time.time()
+	for i in range(repeat):
+		parse(channel, html)
+	return (time.time() - start) / repeat
+
+def nodes(parse, channel, html):
+	""" nodes built by the parser """
+	return len(list(parse(channel, html)[0].descendants))
+
+def memory(parse, channel, html, repeat):
+	""" memory (kB) taken by `repeat` trees kept alive, measured in a child process """
+	read, write = os.pipe()
+	pid = os.fork()
+	if pid == 0:
+		os.close(read)
+		rss   = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		trees = [parse(channel, html) for i in range(repeat)]
+		os.write(write, str(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss))
+		os._exit(0)
+	os.close(write)
+	result = os.read(read, 64)
+	os.waitpid(pid, 0)
+	return int(result)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='')
+	parser.add_argument('pages', nargs='*', help='saved pages, named guardian-*.html or nytimes-*.html')
+	parser.add_argument('--repeat', dest='repeat', type=int, default=20, help='number of parses to time')
+	args  = parser.parse_args()
+	pages = args.pages or [os.path.join(FIXTURES, "%s-synthetic.html" % (name)) for name in sorted(CHANNELS)]
+	for page in pages:
+		with codecs.open(page, encoding="utf-8") as f:
+			html = f.read()
+		channel = CHANNELS[os.path.basename(page).split("-")[0]]()
+		assert body(full_tree(channel, html)) == body(partial_tree(channel, html)) == channel.extract_body(html), "the bodies differ for %s" % (page)
+		print "page       : %s (%d characters, body of %d characters)" % (os.path.basename(page), len(html), len(channel.extract_body(html)))
+		print "            %10s %10s" % ("full", "partial")
+		print "parse (ms)  %10.1f %10.1f" % (parse_time(full_tree, channel, html, args.repeat) * 1000, parse_time(partial_tree, channel, html, args.repeat) * 1000)
+		print "nodes       %10d %10d" % (nodes(full_tree, channel, html), nodes(partial_tree, channel, html))
+		print "memory (kB) %10d %10d" % (memory(full_tree, channel, html, args.repeat), memory(partial_tree, channel, html, args.repeat))
+
+# EOF
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# Encoding: utf-8
+# -----------------------------------------------------------------------------
+# Project : Broken Promises
+# -----------------------------------------------------------------------------
+# Author : Edouard Richard                                  <edou4rd@gmail.com>
+# -----------------------------------------------------------------------------
+# License : GNU General Public License
+# -----------------------------------------------------------------------------
+# Creation : 18-Oct-2026
+# Last mod : 18-Oct-2026
+# -----------------------------------------------------------------------------
+# This file is part of Broken Promises.
+#
+#     Broken Promises is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Broken Promises is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Broken Promises.  If not, see <http://www.gnu.org/licenses/>.
+
+from   brokenpromises import sentences
+import argparse
+import codecs
+import os
+import resource
+import time
+
+__doc__ = """
+
+	Compare the regex sentence splitter to Punkt on a corpus: load time and
+	memory, split time, and how many sentence boundaries they agree on
+	(Punkt being the reference).
+
+"""
+
+CORPUS  = os.path.join(os.path.dirname(__file__), "corpus", "news.txt")
+CLOSING = u"\"')]”’ \t\r\n"
+
+def load(name):
+	""" returns the splitter, its load time (s) and the memory it took (kB) """
+	rss      = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	start    = time.time()
+	splitter = sentences.load(name)
+	return splitter, time.time() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss
+
+def split_time(splitter, text, repeat):
+	start = time.time()
+	for i in range(repeat):
+		splitter.span_tokenize(text)
+	return (time.time() - start) / repeat
+
+def boundaries(splitter, text):
+	""" ends of the sentences, before the closing quotes or brackets which punkt leaves out """
+	ends = set()
+	for start, end in splitter.span_tokenize(text):
+		while end > start and text[end - 1] in CLOSING:
+			end -= 1
+		ends.add(end)
+	return ends
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='')
+	parser.add_argument('corpus', type=str, nargs='?', default=CORPUS, help='text file to split')
+	parser.add_argument('--repeat', dest='repeat', type=int, default=100, help='number of splits to time')
+	args = parser.parse_args()
+	with codecs.open(args.corpus, encoding="utf-8") as f:
+		text = f.read()
+	# the regex splitter first, its memory would be hidden by nltk otherwise
+	regex, regex_load, regex_memory = load("regex")
+	punkt, punkt_load, punkt_memory = load("punkt")
+	reference = boundaries(punkt, text)
+	found     = boundaries(regex, text)
+	agreement = reference & found
+	print "corpus    : %s (%d characters, %d sentences for punkt)" % (args.corpus, len(text), len(reference))
+	print "           %10s %10s" % ("punkt", "regex")
+	print "load (ms)  %10.1f %10.1f" % (punkt_load * 1000, regex_load * 1000)
+	print "memory (kB)%10d %10d" % (punkt_memory, regex_memory)
+	print "split (ms) %10.3f %10.3f" % (split_time(punkt, text, args.repeat) * 1000, split_time(regex, text, args.repeat) * 1000)
+	print "precision  : %.3f" % (float(len(agreement)) / (len(found) or 1))
+	print "recall     : %.3f" % (float(len(agreement)) / (len(reference) or 1))
+	for end in sorted(found ^ reference):
+		print "  %s %r" % (end in reference and "missed" or "extra ", text[max(0, end - 40):end])
+
+# EOF
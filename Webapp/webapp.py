@@ -122,7 +122,9 @@ def last_scrape(year, month=None, day=None):
 @cache.cached(key_prefix=make_cache_key)
 def count_for_date(year, month=None, day=None):
 	date           = (int(year), month and int(month) or None, day and int(day) or None)
-	articles_count = STORAGE.count_articles(date)
+	# ?within=1 counts the references to any date falling in this one
+	within         = bool(int(request.args.get('within', 0)))
+	articles_count = STORAGE.count_articles(date, within=within)
 	response       = json.dumps({
 		"status"        : "ok",
 		"searched_date" : date,
@@ -135,7 +137,8 @@ def count_for_date(year, month=None, day=None):
 @app.route("/search_date/<email>/<year>/<month>/<day>", methods=['post'])
 def search_date(email, year, month=None, day=None):
 	date      = (int(year), month and int(month) or None, day and int(day) or None)
-	collector = CollectArticlesAndSendEmail(get_available_channels(), *date, use_storage=True, email=email)
+	collector = CollectArticlesAndSendEmail(get_available_channels(), *date, use_storage=True, email=email,
+		keep_results=False)
 	job       = worker.run(collector)
 	response  = json.dumps({
 		"status"        : "ok",
@@ -152,8 +155,9 @@ def search_date(email, year, month=None, day=None):
 def articles(year=None, month=None, day=None):
 	limit     = int(request.args.get('limit', 20))
 	skip      = int(request.args.get('skip' , 0))
+	within    = bool(int(request.args.get('within', 0)))
 	date      = (year and int(year) or None, month and int(month) or None, day and int(day) or None)
-	articles  = STORAGE.get_articles(date, limit=limit, skip=skip)
+	articles  = STORAGE.get_articles(date, limit=limit, skip=skip, within=within)
 	response  = json.dumps({
 		"status"   : "ok",
 		"count"    : len(articles),
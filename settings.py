@@ -29,6 +29,49 @@ import os
 
 JOB_TIMEOUT = 600
 
+# sentence splitter used for the extracts: "punkt" (nltk) or "regex" (brokenpromises.sentences.RegexSplitter)
+SENTENCE_SPLITTER = os.getenv("BP_SENTENCE_SPLITTER", "punkt")
+# load the sentence tokenizer in the rq worker, before it forks a process per job
+PRELOAD_TOKENIZER = os.getenv("BP_PRELOAD_TOKENIZER", "1") == "1"
+# number of processes which retrieve the dates from the articles (0 or 1 to do it in the collector's process)
+EXTRACTION_POOL_SIZE  = int(os.getenv("BP_EXTRACTION_POOL_SIZE", 0))
+# number of articles sent at once to a process of the pool
+EXTRACTION_BATCH_SIZE = 10
+# number of articles collected, filtered and saved at once by CollectArticles
+COLLECT_BATCH_SIZE    = int(os.getenv("BP_COLLECT_BATCH_SIZE", 20))
+# number of extractions (article references) kept in memory by a process, 0 to disable
+EXTRACTION_CACHE_SIZE = int(os.getenv("BP_EXTRACTION_CACHE_SIZE", 1000))
+# directory where the extractions are also kept, shared by the processes (none by default)
+EXTRACTION_CACHE_DIR  = os.getenv("BP_EXTRACTION_CACHE_DIR")
+# in seconds, time given to each channel to retrieve its articles, under JOB_TIMEOUT
+CHANNEL_DEADLINE = int(os.getenv("BP_CHANNEL_DEADLINE", 420))
+# number of threads which scrape the article pages of a channel, within its RATE_LIMIT
+SCRAPING_THREADS = int(os.getenv("BP_SCRAPING_THREADS", 8))
+# http client of the channels: timeout in seconds (to connect and to read), retries on 429 and 5xx
+# with a random backoff up to HTTP_BACKOFF * 2^retry seconds, connections kept alive by host
+HTTP_TIMEOUT   = float(os.getenv("BP_HTTP_TIMEOUT", 20))
+HTTP_RETRIES   = int(os.getenv("BP_HTTP_RETRIES", 3))
+HTTP_BACKOFF   = .5
+HTTP_POOL_SIZE = max(10, SCRAPING_THREADS)
+# in seconds, a 429 asking to wait longer (Retry-After) is not retried
+HTTP_MAX_RETRY_AFTER = int(os.getenv("BP_HTTP_MAX_RETRY_AFTER", 60))
+# a date format which brought less than FORMATS_MIN_HIT_RATE new article by collect, averaged over
+# its last FORMATS_WINDOW collects, is only searched again with a FORMATS_REPROBE probability once
+# tried FORMATS_MIN_TRIALS times (with storage, see Channel.select_formats)
+FORMATS_MIN_TRIALS   = int(os.getenv("BP_FORMATS_MIN_TRIALS", 20))
+FORMATS_MIN_HIT_RATE = float(os.getenv("BP_FORMATS_MIN_HIT_RATE", .05))
+FORMATS_WINDOW       = int(os.getenv("BP_FORMATS_WINDOW", 50))
+FORMATS_REPROBE      = float(os.getenv("BP_FORMATS_REPROBE", .1))
+# in days, a stored article body older than this is scraped again
+BODY_MAX_AGE = int(os.getenv("BP_BODY_MAX_AGE", 30))
+# result pages requested by a channel during a collect, beyond the first page of each query.
+# A channel which runs out of it makes the collect "partial", the next one reads it all again
+PAGES_BUDGET = int(os.getenv("BP_PAGES_BUDGET", 20))
+# where the daily quotas of API calls are counted: "redis" (shared by the workers) or "local" (one process)
+QUOTA_LEDGER  = os.getenv("BP_QUOTA_LEDGER", "redis")
+# part of a daily quota that the scheduled collects leave to the searches asked by the users
+QUOTA_RESERVE = float(os.getenv("BP_QUOTA_RESERVE", .2))
+
 BP_CHANNEL_GUARDIAN_API_KEY = os.environ['BP_CHANNEL_GUARDIAN_API_KEY']
 BP_CHANNEL_NYTIMES_API_KEY  = os.environ['BP_CHANNEL_NYTIMES_API_KEY']
 